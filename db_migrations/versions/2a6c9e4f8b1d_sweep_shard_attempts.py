@@ -0,0 +1,31 @@
+"""sweep shard attempts
+
+Revision ID: 2a6c9e4f8b1d
+Revises: 9d5e1f3b7a2c
+Create Date: 2026-10-20 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a6c9e4f8b1d'
+down_revision = '9d5e1f3b7a2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ALTER TYPE ... ADD VALUE нельзя выполнять внутри транзакции.
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE sweepstatus ADD VALUE IF NOT EXISTS 'failed'")
+    op.add_column('sweep_shard', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('sweep_shard', 'attempts')
+    # Значение из перечисления Postgres удалить нельзя, поэтому неудачные шарды
+    # возвращаются в очередь, а задачи — в работу.
+    op.execute("UPDATE sweep_shard SET status = 'pending' WHERE status = 'failed'")
+    op.execute("UPDATE sweep_job SET status = 'running' WHERE status = 'failed'")
@@ -0,0 +1,30 @@
+"""price candle unique
+
+Revision ID: 9d5e1f3b7a2c
+Revises: 6f2b8d4a1c9e
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d5e1f3b7a2c'
+down_revision = '6f2b8d4a1c9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Оставляем последнюю записанную копию каждой свечи.
+    op.execute(
+        'DELETE FROM price_candle a USING price_candle b '
+        'WHERE a.financial_instrument_id = b.financial_instrument_id '
+        'AND a.interval = b.interval AND a.datetime = b.datetime AND a.id < b.id'
+    )
+    op.create_index('ix_price_candle_unique', 'price_candle', ['financial_instrument_id', 'interval', 'datetime'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_price_candle_unique', table_name='price_candle')
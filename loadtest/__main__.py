@@ -0,0 +1,210 @@
+"""Нагрузочное тестирование сервиса.
+
+Запускает `src.api.app:app` с локальным заменителем брокера (BROKER_CLIENT=offline)
+против БД из DB_URI, подаёт запросы из сценария с заданной частотой и записывает
+пропускную способность и перцентили задержек по эндпоинтам и этапам обработки в JSON.
+
+    DB_URI=postgresql://... python -m loadtest loadtest/scenario.json -o results.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))
+    return round(values[index], 3)
+
+
+def summary(values: List[float]) -> dict:
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings = dict()
+    for metric in (header or '').split(','):
+        name, *params = [part.strip() for part in metric.split(';')]
+        for param in params:
+            if param.startswith('dur='):
+                timings[name] = float(param[4:])
+    return timings
+
+
+def start_server(port: int, workers: int, migrate: bool) -> subprocess.Popen:
+    env = dict(os.environ, BROKER_CLIENT='offline')
+    if migrate:
+        subprocess.run(['alembic', 'upgrade', 'head'], cwd=ROOT, env=env, check=True)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'src.api.app:app', '--port', str(port), '--workers', str(workers)],
+        cwd=ROOT, env=env
+    )
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        if server.poll() is not None:
+            raise RuntimeError('Server exited during startup.')
+        try:
+            requests.get(f'{url}/openapi.json', timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(.1)
+    server.terminate()
+    raise RuntimeError('Server did not start in time.')
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.stages = defaultdict(lambda: defaultdict(list))
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        # Фактическое время отправки и отставание от расписания: при нехватке потоков
+        # запросы уходят позже, и частота нагрузки оказывается ниже заданной.
+        self.sent = []
+        self.send_lags = []
+        self._lock = threading.Lock()
+
+    def record_send(self, scheduled: float, sent: float):
+        with self._lock:
+            self.sent.append(sent)
+            self.send_lags.append((sent - scheduled) * 1000)
+
+    def send_rate(self) -> Optional[float]:
+        if len(self.sent) < 2:
+            return None
+        return round((len(self.sent) - 1) / (max(self.sent) - min(self.sent)), 3)
+
+    def record(self, endpoint: str, latency: float, status: Optional[int], timings: Dict[str, float]):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][str(status)] += 1
+            if status is None or status >= 400:
+                self.errors[endpoint] += 1
+            for name, duration in timings.items():
+                self.stages[endpoint][name].append(duration)
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = dict()
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'errors': self.errors[endpoint],
+                'statuses': dict(sorted(self.statuses[endpoint].items())),
+                'throughput': round(len(latencies) / elapsed, 3),
+                'latency_ms': summary(latencies),
+                'stages_ms': {name: summary(values) for name, values in sorted(self.stages[endpoint].items())},
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'throughput': round(total / elapsed, 3),
+            'send_rate': self.send_rate(),
+            'send_lag_ms': summary(self.send_lags),
+            'endpoints': endpoints,
+        }
+
+
+def send(session: requests.Session, url: str, request: dict, recorder: Recorder, scheduled: float):
+    # Задержка считается от запланированного времени отправки, а не от фактического:
+    # иначе ожидание свободного потока не попадает в задержку (coordinated omission).
+    recorder.record_send(scheduled, time.perf_counter())
+    try:
+        response = session.get(url + request['endpoint'], json=request['body'], timeout=300)
+        status, timings = response.status_code, parse_server_timing(response.headers.get('Server-Timing'))
+    except requests.RequestException:
+        status, timings = None, dict()
+    recorder.record(request['endpoint'], (time.perf_counter() - scheduled) * 1000, status, timings)
+
+
+def run(url: str, scenario: dict) -> dict:
+    rnd = random.Random(scenario.get('seed', 0))
+    requests_ = scenario['requests']
+    weights = [r.get('weight', 1) for r in requests_]
+    rate = scenario['rate']
+    total = int(rate * scenario['duration'])
+
+    recorder = Recorder()
+    local = threading.local()
+
+    def task(request, scheduled):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        send(local.session, url, request, recorder, scheduled)
+
+    started = time.perf_counter()
+    # Открытая модель нагрузки: запросы отправляются по расписанию,
+    # не дожидаясь ответов на предыдущие.
+    with ThreadPoolExecutor(max_workers=scenario.get('concurrency', 32)) as executor:
+        for i in range(total):
+            scheduled = started + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, rnd.choices(requests_, weights)[0], scheduled)
+    elapsed = time.perf_counter() - started
+
+    result = recorder.report(elapsed)
+    result['scenario'] = {key: scenario.get(key) for key in ('rate', 'duration', 'concurrency', 'seed')}
+    result['elapsed'] = round(elapsed, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the trading bot API.')
+    parser.add_argument('scenario', help='Path to scenario JSON.')
+    parser.add_argument('-o', '--output', default='loadtest_results.json', help='Where to write results.')
+    parser.add_argument('--url', help='Test an already running service instead of starting one.')
+    parser.add_argument('--port', type=int, default=8011)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--migrate', action='store_true', help='Run alembic migrations before starting.')
+    parser.add_argument('--rate', type=float, help='Override scenario request rate (requests/s).')
+    parser.add_argument('--duration', type=float, help='Override scenario duration (s).')
+    args = parser.parse_args()
+
+    with open(args.scenario) as f:
+        scenario = json.load(f)
+    if args.rate:
+        scenario['rate'] = args.rate
+    if args.duration:
+        scenario['duration'] = args.duration
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args.port, args.workers, args.migrate)
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        result = run(url, scenario)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    print(json.dumps({k: result[k] for k in ('requests', 'errors', 'throughput', 'send_rate')}))
+
+
+if __name__ == '__main__':
+    main()
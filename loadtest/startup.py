@@ -0,0 +1,102 @@
+"""Измерение времени холодного старта сервиса.
+
+Несколько раз импортирует `src.api.app` в отдельном процессе и запускает uvicorn
+до первого ответа, записывает перцентили обоих времён в JSON. Отдельно проверяет,
+что тяжёлые модули (matplotlib, клиент брокера, стратегии) не загружаются при импорте
+приложения, а соединение с БД не устанавливается до первого запроса.
+
+    python -m loadtest.startup -n 20 -o startup_results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import requests
+
+from loadtest.__main__ import ROOT, summary
+
+
+LAZY_MODULES = ['matplotlib', 'openapi_client', 'src.strategy_register.ama', 'src.brokers.tinkoff_adapter']
+
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import src.api.app
+elapsed = (time.perf_counter() - started) * 1000
+from src.db import db
+print(json.dumps({
+    'import_ms': elapsed,
+    'loaded': [name for name in %r if name in sys.modules],
+    'engines': sorted(db._engines),
+}))
+'''
+
+
+def measure_import() -> dict:
+    # Без DB_URI импорт должен проходить: движок создаётся при первом обращении.
+    env = {key: value for key, value in os.environ.items() if key not in ('DB_URI', 'DB_REPLICA_URI')}
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE % LAZY_MODULES],
+        cwd=ROOT, env=env, check=True, stdout=subprocess.PIPE
+    ).stdout
+    return json.loads(output)
+
+
+def measure_first_response(port: int) -> float:
+    env = dict(os.environ, BROKER_CLIENT='offline', PREFETCH_SCHEDULER='0')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'src.api.app:app', '--port', str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError('Server exited during startup.')
+            try:
+                requests.get(f'http://127.0.0.1:{port}/openapi.json', timeout=1)
+                return (time.perf_counter() - started) * 1000
+            except requests.ConnectionError:
+                time.sleep(.01)
+            if time.perf_counter() - started > 60:
+                raise RuntimeError('Server did not start in time.')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start measurement for the trading bot API.')
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('-o', '--output', default='startup_results.json', help='Where to write results.')
+    parser.add_argument('--port', type=int, default=8012)
+    parser.add_argument('--no-server', action='store_true', help='Measure only the application import.')
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    import_ms: List[float] = [probe['import_ms'] for probe in imports]
+    loaded = sorted({name for probe in imports for name in probe['loaded']})
+    engines = sorted({name for probe in imports for name in probe['engines']})
+
+    result = {
+        'runs': args.runs,
+        'import_ms': summary(import_ms),
+        'eagerly_loaded': loaded,
+        'eager_engines': engines,
+    }
+    if not args.no_server:
+        result['first_response_ms'] = summary([measure_first_response(args.port) for _ in range(args.runs)])
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    print(json.dumps(result, sort_keys=True))
+    if loaded or engines:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
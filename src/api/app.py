@@ -2,20 +2,44 @@ from typing import Dict, Union, Optional, List
 import datetime
 import logging
 
-from fastapi import FastAPI, Response, status
+from fastapi import APIRouter, FastAPI, Header, Request, Response, status
 from pydantic import BaseModel
-from openapi_genclient.exceptions import ApiException
+from starlette.concurrency import run_in_threadpool
 
-from .. import core
+from .. import core, prefetch
+from ..brokers import BrokerError
+from ..db import db
+from ..timing import server_timing_header, start_request
 from .exceptions import ValidationError, ObjectNotFound
+from .formats import accepts_msgpack, msgpack_response, to_columns
 
 
-app = FastAPI()
+router = APIRouter()
 
 
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
 
 
+async def add_server_timing(request: Request, call_next):
+    # Длительности этапов обработки отдаются в заголовке Server-Timing.
+    timings = start_request()
+    response = await call_next(request)
+    if timings:
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+async def scope_db_sessions(request: Request, call_next):
+    # У каждого запроса свои сессии БД. По его завершении они закрываются в пуле потоков,
+    # чтобы откат незавершённой транзакции не блокировал цикл событий.
+    token = db.enter_session_scope()
+    try:
+        return await call_next(request)
+    finally:
+        await run_in_threadpool(db.close_sessions)
+        db.exit_session_scope(token)
+
+
 class GetResultsIn(BaseModel):
     datetime_from: Optional[str]
     datetime_to: Optional[str]
@@ -78,7 +102,83 @@ class TrainStrategyOut(TestStrategyOut):
     pass
 
 
-@app.get("/test_strategy", response_model=TestStrategyOut)
+class TestPortfolioIn(BaseModel):
+    datetime_from: str
+    datetime_to: str
+    broker_token: str
+    instrument_tickers: List[str]
+    strategy_code: str
+    strategy_params: Dict[str, Union[int, float]]
+
+
+class PortfolioResult(BaseModel):
+    instrument_ticker: str
+    strategy_profit: float
+    hold_profit: float
+
+
+class TestPortfolioOut(BaseModel):
+    datetime_from: str
+    datetime_to: str
+    instrument_tickers: List[str]
+    strategy_code: str
+    strategy_params: Dict[str, Union[int, float]]
+    strategy_profit: float
+    hold_profit: float
+    results: List[PortfolioResult]
+
+
+class AnalyzeRobustnessIn(TestStrategyIn):
+    samples: int = 500
+    block_size: int = 20
+    seed: Optional[int]
+
+
+class ProfitDistribution(BaseModel):
+    mean: float
+    std: float
+    percentiles: Dict[str, float]
+
+
+class AnalyzeRobustnessOut(TestStrategyOut):
+    samples: int
+    block_size: int
+    seed: Optional[int]
+    strategy_profit_distribution: ProfitDistribution
+    hold_profit_distribution: ProfitDistribution
+    loss_probability: float
+    underperform_probability: float
+
+
+class SweepJobIn(BaseModel):
+    job_id: int
+
+
+class SweepJobOut(SweepJobIn):
+    status: str
+    shards_total: int
+    shards_done: int
+    shards_failed: int
+    strategy_profit: Optional[float]
+    hold_profit: Optional[float]
+    strategy_params: Optional[Dict[str, Union[int, float]]]
+
+
+class SweepResultsIn(GetPrices):
+    strategy_code: str
+
+
+class SweepResult(BaseModel):
+    strategy_params: Dict[str, Union[int, float]]
+    strategy_profit: float
+    hold_profit: float
+
+
+class SweepResultsOut(SweepResultsIn):
+    results: List[SweepResult]
+
+
+@router.get("/test_strategy", response_model=TestStrategyOut)
 def test_strategy(request_data: TestStrategyIn, response: Response):
     try:
         datetime_from, datetime_to = prepare_and_validate_periods(
@@ -99,7 +199,7 @@ def test_strategy(request_data: TestStrategyIn, response: Response):
         )
         request_dict = request_data.dict()
         return TestStrategyOut(**request_dict, **result)
-    except (ApiException, ObjectNotFound) as e:
+    except (BrokerError, ObjectNotFound) as e:
         print(e)
         response.status_code = status.HTTP_404_NOT_FOUND
     except ValueError as e:
@@ -107,7 +207,7 @@ def test_strategy(request_data: TestStrategyIn, response: Response):
         response.status_code = status.HTTP_400_BAD_REQUEST
 
 
-@app.get("/train_strategy", response_model=TrainStrategyOut)
+@router.get("/train_strategy", response_model=TrainStrategyOut)
 def train_strategy(request_data: TrainStrategyIn, response: Response):
     try:
         datetime_from, datetime_to = prepare_and_validate_periods(
@@ -129,7 +229,7 @@ def train_strategy(request_data: TrainStrategyIn, response: Response):
         request_dict = request_data.dict()
         request_dict.update(result)
         return TestStrategyOut(**request_dict)
-    except (ApiException, ObjectNotFound) as e:
+    except (BrokerError, ObjectNotFound) as e:
         print(e)
         response.status_code = status.HTTP_404_NOT_FOUND
     except (ValueError, KeyError) as e:
@@ -137,8 +237,110 @@ def train_strategy(request_data: TrainStrategyIn, response: Response):
         response.status_code = status.HTTP_400_BAD_REQUEST
 
 
-@app.get("/get_results", response_model=GetResultsOut)
-def get_results(request_data: GetResultsIn, response: Response):
+@router.get("/analyze_robustness", response_model=AnalyzeRobustnessOut)
+def analyze_robustness(request_data: AnalyzeRobustnessIn, response: Response):
+    try:
+        datetime_from, datetime_to = prepare_and_validate_periods(
+            request_data.datetime_from, request_data.datetime_to
+        )
+    except (ValidationError, ValueError):
+        print('Wrong dates formats.')
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+    try:
+        result = core.analyze_robustness(
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            broker_token=request_data.broker_token,
+            instrument_ticker=request_data.instrument_ticker,
+            strategy_code=request_data.strategy_code,
+            strategy_params=request_data.strategy_params,
+            samples=request_data.samples,
+            block_size=request_data.block_size,
+            seed=request_data.seed
+        )
+        request_dict = request_data.dict()
+        request_dict.update(result)
+        return AnalyzeRobustnessOut(**request_dict)
+    except (BrokerError, ObjectNotFound) as e:
+        print(e)
+        response.status_code = status.HTTP_404_NOT_FOUND
+    except (ValidationError, ValueError) as e:
+        print(e)
+        response.status_code = status.HTTP_400_BAD_REQUEST
+
+
+@router.get("/train_strategy_distributed", response_model=SweepJobOut)
+def train_strategy_distributed(request_data: TrainStrategyIn, response: Response):
+    try:
+        datetime_from, datetime_to = prepare_and_validate_periods(
+            request_data.datetime_from, request_data.datetime_to
+        )
+    except (ValidationError, ValueError):
+        print('Wrong dates formats.')
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+    try:
+        result = core.submit_sweep(
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            broker_token=request_data.broker_token,
+            instrument_ticker=request_data.instrument_ticker,
+            strategy_code=request_data.strategy_code,
+            strategy_params=request_data.strategy_params
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return SweepJobOut(**result)
+    except (BrokerError, ObjectNotFound) as e:
+        print(e)
+        response.status_code = status.HTTP_404_NOT_FOUND
+    except (ValueError, KeyError) as e:
+        print(e)
+        response.status_code = status.HTTP_400_BAD_REQUEST
+
+
+@router.get("/sweep_job", response_model=SweepJobOut)
+def get_sweep_job(request_data: SweepJobIn, response: Response):
+    try:
+        return SweepJobOut(**core.get_sweep_job(request_data.job_id))
+    except ObjectNotFound as e:
+        print(e)
+        response.status_code = status.HTTP_404_NOT_FOUND
+
+
+@router.get("/test_portfolio", response_model=TestPortfolioOut)
+def test_portfolio(request_data: TestPortfolioIn, response: Response):
+    try:
+        datetime_from, datetime_to = prepare_and_validate_periods(
+            request_data.datetime_from, request_data.datetime_to
+        )
+    except (ValidationError, ValueError):
+        print('Wrong dates formats.')
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+    if not request_data.instrument_tickers:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+    try:
+        result = core.test_portfolio(
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            broker_token=request_data.broker_token,
+            instrument_tickers=request_data.instrument_tickers,
+            strategy_code=request_data.strategy_code,
+            strategy_params=request_data.strategy_params
+        )
+        return TestPortfolioOut(**request_data.dict(), **result)
+    except (BrokerError, ObjectNotFound) as e:
+        print(e)
+        response.status_code = status.HTTP_404_NOT_FOUND
+    except (ValidationError, ValueError) as e:
+        print(e)
+        response.status_code = status.HTTP_400_BAD_REQUEST
+
+
+@router.get("/get_results", response_model=GetResultsOut)
+def get_results(request_data: GetResultsIn, response: Response, accept: Optional[str] = Header(None)):
     try:
         datetime_from = datetime.datetime.strptime(
             request_data.datetime_from, DATETIME_FORMAT) if request_data.datetime_from else None
@@ -169,6 +371,17 @@ def get_results(request_data: GetResultsIn, response: Response):
         response.status_code = status.HTTP_404_NOT_FOUND
         return
 
+    if accepts_msgpack(accept):
+        return msgpack_response({
+            'datetime_from': datetime_from.strftime(DATETIME_FORMAT) if request_data.datetime_from else None,
+            'datetime_to': datetime_to.strftime(DATETIME_FORMAT) if request_data.datetime_to else None,
+            'strategy_code': request_data.strategy_code,
+            'results': to_columns(reports, [
+                'datetime', 'datetime_from', 'datetime_to', 'strategy',
+                'hold_profit', 'strategy_profit', 'instrument_ticker'
+            ])
+        })
+
     result = GetResultsOut(
         datetime_from=datetime_from.strftime(DATETIME_FORMAT) if request_data.datetime_from else None,
         datetime_to=datetime_to.strftime(DATETIME_FORMAT) if request_data.datetime_to else None,
@@ -186,8 +399,37 @@ def get_results(request_data: GetResultsIn, response: Response):
     return result
 
 
-@app.get("/prices", response_model=GetPricesOut)
-def get_prices(request_data: GetPricesIn, response: Response):
+@router.get("/sweep_results", response_model=SweepResultsOut)
+def get_sweep_results(request_data: SweepResultsIn, response: Response, accept: Optional[str] = Header(None)):
+    try:
+        datetime_from, datetime_to = prepare_and_validate_periods(
+            request_data.datetime_from, request_data.datetime_to
+        )
+    except (ValidationError, ValueError):
+        print('Wrong dates formats.')
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+    try:
+        results = core.get_sweep_results(
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            strategy_code=request_data.strategy_code,
+            instrument_ticker=request_data.instrument_ticker
+        )
+    except ObjectNotFound:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return
+
+    if accepts_msgpack(accept):
+        return msgpack_response({
+            **request_data.dict(),
+            'results': to_columns(results, ['strategy_params', 'strategy_profit', 'hold_profit'])
+        })
+    return SweepResultsOut(**request_data.dict(), results=results)
+
+
+@router.get("/prices", response_model=GetPricesOut)
+def get_prices(request_data: GetPricesIn, response: Response, accept: Optional[str] = Header(None)):
     if request_data.datetime_from and request_data.datetime_to:
         try:
             datetime_from, datetime_to = prepare_and_validate_periods(
@@ -201,6 +443,14 @@ def get_prices(request_data: GetPricesIn, response: Response):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return
     try:
+        if accepts_msgpack(accept):
+            # Колонки кодируются напрямую, минуя модели pydantic для каждой свечи.
+            return msgpack_response(core.get_price_columns(
+                datetime_from=datetime_from,
+                datetime_to=datetime_to,
+                broker_token=request_data.broker_token,
+                instrument_ticker=request_data.instrument_ticker,
+            ))
         result = core.get_prices(
             datetime_from=datetime_from,
             datetime_to=datetime_to,
@@ -208,7 +458,7 @@ def get_prices(request_data: GetPricesIn, response: Response):
             instrument_ticker=request_data.instrument_ticker,
         )
         return GetPricesOut(**result)
-    except (ApiException, ObjectNotFound) as e:
+    except (BrokerError, ObjectNotFound) as e:
         print(e)
         response.status_code = status.HTTP_404_NOT_FOUND
 
@@ -223,3 +473,28 @@ def prepare_and_validate_periods(datetime_from: str, datetime_to: str):
         raise ValidationError
     return datetime_from, datetime_to
 
+
+def create_app() -> FastAPI:
+    # БД, клиент брокера и matplotlib инициализируются лениво при первом использовании,
+    # поэтому создание приложения не требует ни подключения к БД, ни тяжёлых импортов.
+    app = FastAPI()
+    app.include_router(router)
+    app.middleware("http")(add_server_timing)
+    app.middleware("http")(scope_db_sessions)
+
+    @app.on_event("startup")
+    def start_prefetch():
+        prefetch.warm_up()
+        if prefetch.WATCHLIST and prefetch.PREFETCH_SCHEDULER:
+            app.state.prefetch_scheduler = prefetch.PrefetchScheduler()
+            app.state.prefetch_scheduler.start()
+
+    @app.on_event("shutdown")
+    def stop_prefetch():
+        if hasattr(app.state, 'prefetch_scheduler'):
+            app.state.prefetch_scheduler.stop()
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,38 @@
+import calendar
+import datetime
+from typing import Iterable, List, Optional
+
+import msgpack
+from fastapi import Response
+
+
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    if not accept:
+        return False
+    media_types = [part.split(';')[0].strip() for part in accept.split(',')]
+    return any(media_type in MSGPACK_MEDIA_TYPES for media_type in media_types)
+
+
+def timestamp(value: datetime.datetime) -> int:
+    # Время без часового пояса в БД хранится в UTC.
+    return calendar.timegm(value.utctimetuple())
+
+
+def to_columns(rows: Iterable[dict], fields: List[str]) -> dict:
+    # Переводит список записей в колоночное представление: поле -> массив значений.
+    columns = {field: [] for field in fields}
+    for row in rows:
+        for field in fields:
+            value = row[field]
+            columns[field].append(timestamp(value) if isinstance(value, datetime.datetime) else value)
+    return columns
+
+
+def msgpack_response(content: dict) -> Response:
+    return Response(
+        content=msgpack.packb(content, use_bin_type=True),
+        media_type=MSGPACK_MEDIA_TYPES[0]
+    )
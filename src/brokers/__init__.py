@@ -1,6 +1,11 @@
 from datetime import datetime
 from abc import ABC
-from typing import Optional
+from typing import List, Optional
+
+
+class BrokerError(Exception):
+    # Ошибка запроса к брокеру, оставшаяся после всех повторов.
+    pass
 
 
 class BrokerClientAbstract(ABC):
@@ -13,3 +18,20 @@ class BrokerClientAbstract(ABC):
             figi: Optional[str]
     ) -> dict:
         raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CandleFeedAbstract(ABC):
+    # Поток обновлений свечей. receive возвращает очередное обновление в формате
+    # свечей get_prices (с ключами figi, time, o, c, h, l) и бросает ConnectionError
+    # при обрыве соединения.
+    def subscribe(self, figis: List[str], interval: str):
+        raise NotImplementedError
+
+    def receive(self) -> dict:
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from . import BrokerClientAbstract
+
+
+# Ограничения брокера на число запросов. По умолчанию — 120 запросов в минуту на токен.
+BROKER_RATE_LIMIT = float(os.environ.get('BROKER_RATE_LIMIT', 120))
+BROKER_RATE_PERIOD = float(os.environ.get('BROKER_RATE_PERIOD', 60))
+BROKER_CLIENTS_MAX_SIZE = int(os.environ.get('BROKER_CLIENTS_MAX_SIZE', 64))
+
+
+class TokenBucket:
+    # Ведро токенов: допускает всплеск до capacity запросов,
+    # после чего пропускает не более rate запросов в секунду.
+    def __init__(self, capacity: float = BROKER_RATE_LIMIT, rate: float = BROKER_RATE_LIMIT / BROKER_RATE_PERIOD):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        # Вместо ошибки при всплеске запросов ждём, пока в ведре не появится токен.
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BrokerClientManager:
+    # Хранит клиентов брокера по токену и вытесняет давно не использовавшихся.
+    # Клиент переиспользуется между запросами, поэтому его HTTP-соединения
+    # остаются открытыми (keep-alive) в пуле соединений клиента.
+    def __init__(self, client_factory: Callable[[str], BrokerClientAbstract], max_size: int = BROKER_CLIENTS_MAX_SIZE):
+        self.client_factory = client_factory
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> BrokerClientAbstract:
+        with self._lock:
+            if token in self._clients:
+                self._clients.move_to_end(token)
+                return self._clients[token]
+
+            client = self.client_factory(token)
+            self._clients[token] = client
+            while len(self._clients) > self.max_size:
+                _, evicted = self._clients.popitem(last=False)
+                evicted.close()
+            return client
+
+    def clear(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
@@ -0,0 +1,136 @@
+import math
+import os
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+
+from . import BrokerClientAbstract, CandleFeedAbstract
+
+
+# Искусственная задержка ответа брокера в секундах.
+OFFLINE_BROKER_LATENCY = float(os.environ.get('OFFLINE_BROKER_LATENCY', 0))
+# Сколько минутных свечей в секунду выдаёт заменитель потока.
+OFFLINE_FEED_SPEED = float(os.environ.get('OFFLINE_FEED_SPEED', 1))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32(':'.join(str(p) for p in parts).encode())
+
+
+def offline_figi(ticker: str) -> str:
+    return f'OFF{_seed(ticker):09d}'[:12]
+
+
+def offline_candle(figi: str, moment: datetime, interval: str, update: int = 0) -> dict:
+    # Цены детерминированно зависят только от figi и времени свечи, поэтому
+    # пересекающиеся периоды и поток всегда дают одинаковые свечи.
+    seed = _seed(figi)
+    base = 20 + seed % 200
+    if interval == 'day':
+        moment = datetime(moment.year, moment.month, moment.day, 7, tzinfo=pytz.UTC)
+        ordinal = moment.toordinal()
+    else:
+        moment = moment.replace(second=0, microsecond=0)
+        ordinal = int((moment - EPOCH).total_seconds() // 60) / 1440
+    trend = 1 + .3 * math.sin(ordinal / (30 + seed % 40)) + .1 * math.sin(ordinal / 7)
+    rnd = random.Random(_seed(figi, moment.isoformat()))
+    price_open = base * trend * (1 + rnd.gauss(0, .01))
+    price_close = price_open * (1 + rnd.gauss(0, .01))
+    # Незавершённая свеча: закрытие постепенно приближается к итоговому.
+    price_close = price_open + (price_close - price_open) * min(1., (update + 1) / 3)
+    return {
+        'figi': figi,
+        'interval': interval,
+        'time': moment,
+        'o': round(price_open, 2),
+        'c': round(price_close, 2),
+        'h': round(max(price_open, price_close) * (1 + abs(rnd.gauss(0, .005))), 2),
+        'l': round(min(price_open, price_close) * (1 - abs(rnd.gauss(0, .005))), 2),
+        'v': rnd.randint(1000, 100000),
+    }
+
+
+class OfflineBrokerClient(BrokerClientAbstract):
+    # Заменитель брокера для нагрузочного тестирования и локальной разработки.
+    def __init__(self, token):
+        self.token = token
+
+    def get_instrument_by_ticker(self, ticker: str) -> Optional[dict]:
+        time.sleep(OFFLINE_BROKER_LATENCY)
+        return {
+            'ticker': ticker,
+            'figi': offline_figi(ticker),
+            'name': f'{ticker} (offline)',
+        }
+
+    def get_prices(
+            self, ticker: str, datetime_from: datetime,
+            datetime_to: datetime, interval: str,
+            figi: Optional[str] = None
+    ) -> list:
+        time.sleep(OFFLINE_BROKER_LATENCY)
+        figi = figi or offline_figi(ticker)
+        if datetime_from.tzinfo is None:
+            datetime_from = pytz.UTC.localize(datetime_from)
+        if datetime_to.tzinfo is None:
+            datetime_to = pytz.UTC.localize(datetime_to)
+
+        prices = []
+        if interval == 'day':
+            day = datetime_from.replace(hour=0, minute=0, second=0, microsecond=0)
+            step = timedelta(days=1)
+        else:
+            day = datetime_from.replace(second=0, microsecond=0)
+            step = timedelta(minutes=1)
+        while day <= datetime_to:
+            # Торгов по выходным нет.
+            if day.weekday() < 5:
+                prices.append(offline_candle(figi, day, interval))
+            day += step
+        return prices
+
+
+class OfflineCandleFeed(CandleFeedAbstract):
+    # Заменитель потока свечей: по каждому инструменту выдаёт несколько
+    # обновлений текущей минутной свечи, затем переходит к следующей минуте.
+    # disconnect_every позволяет имитировать обрывы соединения.
+    def __init__(self, token, speed: float = OFFLINE_FEED_SPEED, updates: int = 3, disconnect_every: int = 0):
+        self.token = token
+        self.speed = speed
+        self.updates = updates
+        self.disconnect_every = disconnect_every
+        self._figis = []
+        self._interval = None
+        self._moment = None
+        self._step = 0
+        self._received = 0
+
+    def subscribe(self, figis, interval):
+        self._figis = list(figis)
+        self._interval = interval
+        self._moment = datetime.now(pytz.UTC).replace(second=0, microsecond=0)
+        self._step = 0
+
+    def receive(self) -> dict:
+        if not self._figis:
+            raise ConnectionError('Not subscribed.')
+        self._received += 1
+        if self.disconnect_every and self._received % self.disconnect_every == 0:
+            self._figis = []
+            raise ConnectionError('Offline feed disconnect.')
+
+        figi_index, update = divmod(self._step, self.updates)
+        figi_index %= len(self._figis)
+        self._step += 1
+        if self._step == len(self._figis) * self.updates:
+            self._step = 0
+            self._moment += timedelta(minutes=1)
+            if self.speed:
+                time.sleep(1 / self.speed)
+        return offline_candle(self._figis[figi_index], self._moment, self._interval, update)
@@ -3,17 +3,56 @@ from datetime import datetime
 from typing import Optional
 
 from openapi_client import openapi
+from openapi_genclient.exceptions import ApiException
+from retrying import retry
+from urllib3.exceptions import HTTPError
 
-from . import BrokerClientAbstract
+from . import BrokerClientAbstract, BrokerError
+from .manager import TokenBucket
+
+
+# Статусы ответов брокера, при которых запрос имеет смысл повторить.
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+
+def is_transient_error(exception: Exception) -> bool:
+    if isinstance(exception, ApiException):
+        return exception.status in TRANSIENT_STATUSES
+    return isinstance(exception, HTTPError)
 
 
 class TinkoffBrokerClient(BrokerClientAbstract):
     def __init__(self, token):
         self.token = token
         self.client = openapi.sandbox_api_client(self.token)
+        self.bucket = TokenBucket()
+
+    def close(self):
+        # Закрываем соединения, которые держит пул urllib3 клиента.
+        self.client.market.api_client.rest_client.pool_manager.clear()
+
+    # Повторяем временные ошибки с экспоненциальной задержкой и случайным разбросом,
+    # чтобы одновременные запросы не повторялись синхронно.
+    @retry(
+        retry_on_exception=is_transient_error,
+        stop_max_attempt_number=4,
+        wait_exponential_multiplier=500,
+        wait_exponential_max=8000,
+        wait_jitter_max=500
+    )
+    def _request(self, method, *args, **kwargs):
+        self.bucket.acquire()
+        return method(*args, **kwargs).to_dict()
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return self._request(method, *args, **kwargs)
+        except (ApiException, HTTPError) as e:
+            # Ошибки API и сети (например, MaxRetryError после исчерпания повторов) отдаются как BrokerError.
+            raise BrokerError(str(e)) from e
 
     def get_instrument_by_ticker(self, ticker: str) -> Optional[dict]:
-        response = self.client.market.market_search_by_ticker_get(ticker).to_dict()
+        response = self._call(self.client.market.market_search_by_ticker_get, ticker)
         instruments = response['payload']['instruments']
         if len(instruments) > 0:
             return instruments[0]
@@ -27,12 +66,13 @@ class TinkoffBrokerClient(BrokerClientAbstract):
         if not figi:
             figi = self.get_instrument_by_ticker(ticker)['figi']
         if datetime_from.year == datetime_to.year:
-            prices = self.client.market.market_candles_get(
+            prices = self._call(
+                self.client.market.market_candles_get,
                 figi=figi,
                 _from=datetime_from,
                 to=datetime_to,
                 interval=interval
-            ).to_dict()['payload']['candles']
+            )['payload']['candles']
         else:
             prices = []
             for year in range(datetime_from.year, datetime_to.year + 1):
@@ -42,11 +82,12 @@ class TinkoffBrokerClient(BrokerClientAbstract):
                     from_ = datetime_from
                 elif year == datetime_to.year:
                     to = datetime_to
-                prices.extend(self.client.market.market_candles_get(
+                prices.extend(self._call(
+                    self.client.market.market_candles_get,
                     figi=figi,
                     _from=from_,
                     to=to,
                     interval=interval
-                ).to_dict()['payload']['candles'])
+                )['payload']['candles'])
 
         return prices
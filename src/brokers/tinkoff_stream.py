@@ -0,0 +1,45 @@
+import json
+
+import websocket
+from dateutil.parser import isoparse
+
+from . import CandleFeedAbstract
+
+
+STREAMING_URL = 'wss://api-invest.tinkoff.ru/openapi/md/v1/md-openapi/ws'
+
+
+class TinkoffCandleFeed(CandleFeedAbstract):
+    def __init__(self, token, url: str = STREAMING_URL, timeout: float = 60):
+        self.token = token
+        self.url = url
+        self.timeout = timeout
+        self._connection = None
+
+    def subscribe(self, figis, interval):
+        try:
+            self._connection = websocket.create_connection(
+                self.url,
+                header=[f'Authorization: Bearer {self.token}'],
+                timeout=self.timeout
+            )
+            for figi in figis:
+                self._connection.send(json.dumps({'event': 'candle:subscribe', 'figi': figi, 'interval': interval}))
+        except (websocket.WebSocketException, OSError) as e:
+            raise ConnectionError(e)
+
+    def receive(self) -> dict:
+        while True:
+            try:
+                message = json.loads(self._connection.recv())
+            except (websocket.WebSocketException, OSError) as e:
+                raise ConnectionError(e)
+            if message.get('event') == 'candle':
+                candle = dict(message['payload'])
+                candle['time'] = isoparse(candle['time'])
+                return candle
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -1,25 +1,76 @@
-from datetime import datetime
-from typing import List
-
-from .brokers.tinkoff_adapter import TinkoffBrokerClient
+import calendar
+import importlib
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+import pytz
+
+from .brokers.manager import BrokerClientManager
 from .strategy_register import strategies
 from .api.exceptions import ObjectNotFound, ValidationError
 from .db import db
+from .robustness import block_bootstrap, describe
+from .single_flight import SingleFlight
+from .timing import stage
 
 
 DEFAULT_PRICE_INTERVAL = 'day'
 
-clients = dict()
+# Насколько загруженный период может отставать от текущего момента, чтобы запрошенный
+# до текущего момента период считался уже загруженным (например, предзагрузкой списка наблюдения).
+# Исторический период должен быть покрыт полностью.
+PRICE_FRESHNESS = timedelta(days=int(os.environ.get('PRICE_FRESHNESS_DAYS', 1)))
+
+# Ограничения анализа устойчивости, чтобы он укладывался в таймаут запроса.
+ROBUSTNESS_MAX_SAMPLES = int(os.environ.get('ROBUSTNESS_MAX_SAMPLES', 2000))
+
+# На сколько шардов максимально делится распределённый перебор параметров.
+SWEEP_SHARDS = int(os.environ.get('SWEEP_SHARDS', 16))
+# Сколько раз шард выдаётся воркерам, прежде чем считаться неудачным.
+SWEEP_MAX_ATTEMPTS = int(os.environ.get('SWEEP_MAX_ATTEMPTS', 3))
+
+# Клиент брокера: tinkoff — реальный брокер, offline — локальный заменитель для нагрузочных тестов.
+BROKER_CLIENT = os.environ.get('BROKER_CLIENT', 'tinkoff')
+broker_clients = {
+    'tinkoff': ('.brokers.tinkoff_adapter', 'TinkoffBrokerClient'),
+    'offline': ('.brokers.offline_adapter', 'OfflineBrokerClient'),
+}
+# Строить график лучшего результата после перебора (только для локальной отладки).
+SHOW_PLOT = os.environ.get('SHOW_PLOT') == '1'
+
+
+def create_broker_client(token: str):
+    # Модуль клиента (и сгенерированный клиент API) импортируется при первом обращении к брокеру.
+    module_name, class_name = broker_clients[BROKER_CLIENT]
+    return getattr(importlib.import_module(module_name, __package__), class_name)(token)
+
+
+clients = BrokerClientManager(create_broker_client)
+
+# Одновременные запросы одного и того же инструмента и периода
+# обращаются к брокеру и пишут свечи в БД только один раз.
+instrument_flights = SingleFlight()
+price_flights = SingleFlight()
+
+# Результат загрузки разделяется между потоками, поэтому инструменты и свечи
+# возвращаются простыми значениями, а не объектами ORM из сессии загрузившего потока.
+Instrument = namedtuple('Instrument', ['id', 'ticker', 'figi', 'name'])
 
 
 def get_or_create_client(token: str):
-    if token in clients.keys():
-        return clients[token]
-    clients[token] = TinkoffBrokerClient(token)
-    return clients[token]
+    return clients.get(token)
 
 
 def fetch_instrument(ticker, broker_token):
+    with stage('fetch_instrument'):
+        return instrument_flights.do(ticker, _fetch_instrument, ticker, broker_token)
+
+
+def _fetch_instrument(ticker, broker_token):
     broker_client = get_or_create_client(broker_token)
     instrument = db.get_instrument(ticker=ticker)
 
@@ -34,7 +85,7 @@ def fetch_instrument(ticker, broker_token):
         )
 
     instrument, created = db.get_or_create_instrument(instrument)
-    return instrument
+    return Instrument(id=instrument.id, ticker=instrument.ticker, figi=instrument.figi, name=instrument.name)
 
 
 def fetch_prices(
@@ -44,6 +95,66 @@ def fetch_prices(
         instrument,
         interval,
         strategy
+):
+    with stage('fetch_prices'):
+        return price_flights.do(
+            (instrument.id, interval, datetime_from, datetime_to),
+            _fetch_prices,
+            datetime_from, datetime_to, broker_token, instrument, interval, strategy
+        )
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    # Время в БД хранится в UTC без часового пояса.
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(pytz.UTC).replace(tzinfo=None)
+
+
+def prices_stored(instrument, interval, datetime_from, datetime_to) -> bool:
+    # Период загружен, если его без разрывов покрывают ранее загруженные периоды.
+    datetime_from, datetime_to = to_naive_utc(datetime_from), to_naive_utc(datetime_to)
+    covered_to = datetime_from
+    for coverage in db.get_price_coverage(instrument.id, interval, datetime_from, datetime_to):
+        if coverage.datetime_from > covered_to:
+            break
+        covered_to = max(covered_to, coverage.datetime_to)
+    # Допуск только для периода, который заканчивается около текущего момента: последних свечей
+    # может ещё не быть. Иначе пропустили бы свечи, появившиеся после прошлой загрузки.
+    required_to = datetime_to
+    now = datetime.utcnow()
+    if datetime_to >= now - PRICE_FRESHNESS:
+        required_to = min(datetime_to, now) - PRICE_FRESHNESS
+    return covered_to >= required_to
+
+
+def load_prices(broker_client, instrument, interval, datetime_from, datetime_to):
+    prices = broker_client.get_prices(
+        ticker=instrument.ticker,
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        interval=interval,
+        figi=instrument.figi
+    )
+    # Покрытым считаем период только до текущего момента: будущих свечей ещё нет.
+    now = datetime.now(pytz.UTC) if datetime_to.tzinfo else datetime.utcnow()
+    db.write_prices(
+        prices,
+        interval=interval,
+        financial_instrument_id=instrument.id,
+        datetime_from=to_naive_utc(datetime_from),
+        datetime_to=to_naive_utc(min(datetime_to, now))
+    )
+    return prices
+
+
+def _fetch_prices(
+        datetime_from,
+        datetime_to,
+        broker_token,
+        instrument,
+        interval,
+        strategy
 ):
     broker_client = get_or_create_client(broker_token)
     report = db.get_report(
@@ -53,24 +164,50 @@ def fetch_prices(
         financial_instrument_id=instrument.id,
         interval=interval
     )
+    # Свечи уже в БД, если по периоду есть отчёт или их загрузила предзагрузка.
+    stored = report is not None or prices_stored(instrument, interval, datetime_from, datetime_to)
 
-    if report is None:
-        prices = broker_client.get_prices(
-            ticker=instrument.ticker,
-            datetime_from=datetime_from,
-            datetime_to=datetime_to,
-            interval=interval,
-            figi=instrument.figi
-        )
-        db.write_prices(prices, interval=interval, financial_instrument_id=instrument.id)
-    return db.get_prices(
+    if not stored:
+        load_prices(broker_client, instrument, interval, datetime_from, datetime_to)
+    return tuple(db.get_prices(
         datetime_from=datetime_from,
         datetime_to=datetime_to,
         financial_instrument_id=instrument.id,
+        interval=interval,
+        use_primary=not stored
+    ))
+
+
+def get_checkpoint(datetime_from, datetime_to, strategy_code, strategy_params, instrument, interval):
+    return db.get_checkpoint(
+        datetime_from=to_naive_utc(datetime_from),
+        datetime_to=to_naive_utc(datetime_to),
+        strategy=strategy_code,
+        strategy_params=json.dumps(strategy_params, sort_keys=True),
+        financial_instrument_id=instrument.id,
         interval=interval
     )
 
 
+def fetch_prices_after(checkpoint, datetime_to, broker_token, instrument, interval, strategy):
+    # Свечи после последней обработанной. Её саму тоже загружаем, чтобы убедиться,
+    # что история с момента расчёта не изменилась; иначе чекпоинт не используется.
+    prices = fetch_prices(
+        checkpoint.price_datetime.replace(tzinfo=pytz.UTC), datetime_to, broker_token, instrument, interval, strategy
+    )
+    if not prices or prices[0].datetime != checkpoint.price_datetime:
+        return None
+    return prices[1:]
+
+
+def resume_strategy(strategy, prices: List[float], strategy_params: dict, state: dict = None):
+    # Стратегии без поддержки чекпоинтов считаются по всему периоду.
+    try:
+        return strategy.resume(prices, strategy_params, state)
+    except NotImplementedError:
+        return strategy.calculate(prices, strategy_params) + (None,)
+
+
 def test_strategy(
         datetime_from,
         datetime_to,
@@ -85,69 +222,85 @@ def test_strategy(
 
     instrument = fetch_instrument(instrument_ticker, broker_token)
 
-    prices = fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
-
     if not strategies.get(strategy_code):
         raise ObjectNotFound('Strategy not found.')
 
+    # Если тот же расчёт уже делался на более коротком периоде, продолжаем его
+    # с сохранённого состояния и обрабатываем только новые свечи.
+    checkpoint = get_checkpoint(datetime_from, datetime_to, strategy_code, strategy_params, instrument, interval)
+    prices = None
+    if checkpoint is not None:
+        prices = fetch_prices_after(checkpoint, datetime_to, broker_token, instrument, interval, strategy_code)
+    if prices is None:
+        checkpoint = None
+        prices = fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
+
     try:
-        strategy_profit, hold_profit = strategies[strategy_code].calculate(
-            [price.price_open for price in prices],
-            strategy_params
-        )
+        with stage('calculate'):
+            strategy_profit, hold_profit, state = resume_strategy(
+                strategies[strategy_code],
+                [price.price_open for price in prices],
+                strategy_params,
+                checkpoint.state if checkpoint is not None else None
+            )
     except (KeyError, ValueError):
         raise ValidationError('Wrong strategy parameters.')
 
     if strategy_profit is None or hold_profit is None:
         raise ValidationError('Max strategy param value greater than period.')
-    db.write_report(
-        datetime=now,
-        datetime_from=datetime_from,
-        datetime_to=datetime_to,
-        strategy=strategy_code,
-        interval=interval,
-        hold_profit=hold_profit,
-        strategy_profit=strategy_profit,
-        financial_instrument_id=instrument.id
-    )
+    with stage('write_report'):
+        db.write_report(
+            datetime=now,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            strategy=strategy_code,
+            interval=interval,
+            hold_profit=hold_profit,
+            strategy_profit=strategy_profit,
+            financial_instrument_id=instrument.id
+        )
+        # Новый чекпоинт нужен, только если появились необработанные свечи.
+        if state is not None and prices:
+            db.write_checkpoint(
+                datetime=now,
+                datetime_from=to_naive_utc(datetime_from),
+                datetime_to=to_naive_utc(datetime_to),
+                strategy=strategy_code,
+                interval=interval,
+                strategy_params=json.dumps(strategy_params, sort_keys=True),
+                price_datetime=prices[-1].datetime,
+                state=state,
+                financial_instrument_id=instrument.id
+            )
     return {
         'strategy_profit': strategy_profit,
         'hold_profit': hold_profit
     }
 
 
-def train_strategy(
-        datetime_from,
-        datetime_to,
-        broker_token,
-        instrument_ticker,
-        strategy_code,
-        strategy_params
-) -> dict:
-
-    now = datetime.now()
-
-    interval = DEFAULT_PRICE_INTERVAL
-
-    instrument = fetch_instrument(instrument_ticker, broker_token)
-
-    prices = fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
-
+def validate_param_ranges(strategy_params: dict):
     for dia in strategy_params.values():
         if not (isinstance(dia, list) or isinstance(dia, tuple)):
             raise KeyError("Wrong param type.")
         if not (isinstance(dia[0], int) and isinstance(dia[1], int)):
             raise KeyError("Param must contain integers.")
 
-    if not strategies.get(strategy_code):
-        raise ObjectNotFound('Strategy not found.')
 
-    prepared_prices = [price.price_open for price in prices]
+def get_known_sweep_results(datetime_from, datetime_to, strategy_code, financial_instrument_id, interval) -> dict:
+    # Точки, уже посчитанные предыдущими переборами на этом же периоде, не пересчитываем.
+    return {
+        tuple(sorted(r.strategy_params.items())): (r.strategy_profit, r.hold_profit)
+        for r in db.get_sweep_results(datetime_from, datetime_to, strategy_code, financial_instrument_id, interval)
+    }
+
+
+def sweep_strategy(strategy_code, prepared_prices, strategy_params, known_results):
+    # Перебирает сетку параметров и возвращает лучший результат и новые точки перебора.
     max_profit = -99999.
     max_params = None
     hold_profit = None
+    new_results = []
 
-    i = 1
     for slow in range(strategy_params['slow'][0], strategy_params['slow'][1] + 1):
         for n in range(strategy_params['n'][0], strategy_params['n'][1] + 1):
             for fast in range(strategy_params['fast'][0], strategy_params['fast'][1] + 1):
@@ -158,29 +311,85 @@ def train_strategy(
                     'n': n,
                     'slow': slow
                 }
-                strategy_profit, hold_profit = strategies[strategy_code].calculate(
-                    prepared_prices,
-                    params
-                )
+                known_result = known_results.get(tuple(sorted(params.items())))
+                if known_result is not None:
+                    strategy_profit, hold_profit = known_result
+                else:
+                    strategy_profit, hold_profit = strategies[strategy_code].calculate(
+                        prepared_prices,
+                        params
+                    )
+                    if strategy_profit is not None:
+                        new_results.append({
+                            'strategy_params': params,
+                            'strategy_profit': strategy_profit,
+                            'hold_profit': hold_profit
+                        })
                 if strategy_profit > max_profit:
                     max_profit = strategy_profit
                     max_params = params
-                i += 1
 
-    _ = strategies[strategy_code].calculate(prepared_prices, max_params, show_plot=True)
+    return max_profit, max_params, hold_profit, new_results
 
-    if hold_profit:
-        db.write_report(
-            datetime=now,
-            datetime_from=datetime_from,
-            datetime_to=datetime_to,
-            strategy=strategy_code,
-            interval=interval,
-            hold_profit=hold_profit,
-            strategy_profit=max_profit,
-            financial_instrument_id=instrument.id
+
+def train_strategy(
+        datetime_from,
+        datetime_to,
+        broker_token,
+        instrument_ticker,
+        strategy_code,
+        strategy_params
+) -> dict:
+
+    now = datetime.now()
+
+    interval = DEFAULT_PRICE_INTERVAL
+
+    instrument = fetch_instrument(instrument_ticker, broker_token)
+
+    prices = fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
+
+    validate_param_ranges(strategy_params)
+
+    if not strategies.get(strategy_code):
+        raise ObjectNotFound('Strategy not found.')
+
+    prepared_prices = [price.price_open for price in prices]
+    known_results = get_known_sweep_results(datetime_from, datetime_to, strategy_code, instrument.id, interval)
+
+    with stage('calculate'):
+        max_profit, max_params, hold_profit, new_results = sweep_strategy(
+            strategy_code, prepared_prices, strategy_params, known_results
         )
 
+    if SHOW_PLOT:
+        _ = strategies[strategy_code].calculate(prepared_prices, max_params, show_plot=True)
+
+    if new_results:
+        with stage('write_sweep_results'):
+            db.write_sweep_results(
+                datetime=now,
+                datetime_from=datetime_from,
+                datetime_to=datetime_to,
+                strategy=strategy_code,
+                interval=interval,
+                results=new_results,
+                financial_instrument_id=instrument.id
+            )
+
+    if hold_profit:
+        with stage('write_report'):
+            db.write_report(
+                datetime=now,
+                datetime_from=datetime_from,
+                datetime_to=datetime_to,
+                strategy=strategy_code,
+                interval=interval,
+                hold_profit=hold_profit,
+                strategy_profit=max_profit,
+                financial_instrument_id=instrument.id
+            )
+
     return {
         'strategy_profit': max_profit,
         'hold_profit': hold_profit,
@@ -188,7 +397,215 @@ def train_strategy(
     }
 
 
+def split_param_ranges(strategy_params: dict, shards_count: int) -> List[dict]:
+    # Делим сетку по параметру slow: каждый шард перебирает свой отрезок его значений.
+    slow_from, slow_to = strategy_params['slow'][0], strategy_params['slow'][1]
+    values_count = slow_to - slow_from + 1
+    if values_count < 1:
+        raise KeyError("Wrong param range.")
+    shards_count = max(1, min(shards_count, values_count))
+    size = -(-values_count // shards_count)
+    return [
+        dict(strategy_params, slow=[start, min(start + size - 1, slow_to)])
+        for start in range(slow_from, slow_to + 1, size)
+    ]
+
+
+def submit_sweep(
+        datetime_from,
+        datetime_to,
+        broker_token,
+        instrument_ticker,
+        strategy_code,
+        strategy_params
+) -> dict:
+    interval = DEFAULT_PRICE_INTERVAL
+
+    validate_param_ranges(strategy_params)
+    if not strategies.get(strategy_code):
+        raise ObjectNotFound('Strategy not found.')
+
+    instrument = fetch_instrument(instrument_ticker, broker_token)
+    # Свечи загружаются в БД заранее: воркеры читают их оттуда, не обращаясь к брокеру.
+    fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
+
+    job = db.create_sweep_job(
+        datetime=datetime.now(),
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        strategy=strategy_code,
+        interval=interval,
+        financial_instrument_id=instrument.id,
+        shards=split_param_ranges(strategy_params, SWEEP_SHARDS)
+    )
+    return get_sweep_job(job.id)
+
+
+def run_sweep_shard(shard, prepared_prices: List[float], worker: str):
+    job = shard.sweep_job
+    known_results = get_known_sweep_results(
+        job.datetime_from, job.datetime_to, job.strategy, job.financial_instrument_id, job.interval
+    )
+    max_profit, max_params, hold_profit, new_results = sweep_strategy(
+        job.strategy, prepared_prices, shard.param_ranges, known_results
+    )
+
+    finished = db.finish_sweep_shard(
+        shard.id,
+        worker,
+        strategy_params=max_params,
+        strategy_profit=max_profit if max_params else None,
+        hold_profit=hold_profit,
+        results=new_results
+    )
+    if not finished:
+        # Шард тем временем выдан другому воркеру, результат отброшен.
+        return None
+    # Воркер, закончивший последний шард, сводит результаты в итоговый отчёт.
+    return db.reduce_sweep_job(job.id)
+
+
+def release_sweep_shard(shard, worker: str):
+    job_id = shard.sweep_job_id
+    if db.release_sweep_shard(shard.id, worker, SWEEP_MAX_ATTEMPTS):
+        return db.reduce_sweep_job(job_id)
+
+
+def get_sweep_job(job_id: int) -> dict:
+    job = db.get_sweep_job(job_id)
+    if job is None:
+        raise ObjectNotFound('Sweep job not found.')
+    progress = db.get_sweep_job_progress(job_id)
+    return {
+        'job_id': job.id,
+        'status': str(job.status),
+        'shards_total': sum(progress.values()),
+        'shards_done': progress.get(db.models.SweepStatus.done, 0),
+        'shards_failed': progress.get(db.models.SweepStatus.failed, 0),
+        'strategy_profit': job.strategy_profit,
+        'hold_profit': job.hold_profit,
+        'strategy_params': job.strategy_params,
+    }
+
+
+def analyze_robustness(
+        datetime_from,
+        datetime_to,
+        broker_token,
+        instrument_ticker,
+        strategy_code,
+        strategy_params,
+        samples,
+        block_size,
+        seed=None
+) -> dict:
+    interval = DEFAULT_PRICE_INTERVAL
+
+    if not strategies.get(strategy_code):
+        raise ObjectNotFound('Strategy not found.')
+    if not 0 < samples <= ROBUSTNESS_MAX_SAMPLES or block_size < 1:
+        raise ValidationError('Wrong bootstrap parameters.')
+
+    instrument = fetch_instrument(instrument_ticker, broker_token)
+    prices = fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
+    prepared_prices = [price.price_open for price in prices]
+    if len(prepared_prices) < 2:
+        raise ValidationError('Max strategy param value greater than period.')
+
+    strategy = strategies[strategy_code]
+    try:
+        with stage('calculate'):
+            strategy_profit, hold_profit = strategy.calculate(prepared_prices, strategy_params)
+            # Все выборки считаются одним проходом как портфель из samples рядов.
+            # Выборки случайны и больше не встретятся, поэтому индикаторы по ним не кэшируются.
+            paths = block_bootstrap(prepared_prices, samples, block_size, seed)
+            strategy_profits, hold_profits = strategy.calculate_portfolio(paths, strategy_params, use_cache=False)
+    except NotImplementedError:
+        raise ValidationError('Strategy does not support batched calculation.')
+    except (KeyError, ValueError):
+        raise ValidationError('Wrong strategy parameters.')
+
+    if strategy_profit is None or strategy_profits is None:
+        raise ValidationError('Max strategy param value greater than period.')
+
+    return {
+        'strategy_profit': strategy_profit,
+        'hold_profit': hold_profit,
+        'samples': samples,
+        'block_size': block_size,
+        'strategy_profit_distribution': describe(strategy_profits),
+        'hold_profit_distribution': describe(hold_profits),
+        # Доля выборок, в которых стратегия оказалась в убытке и в которых уступила удержанию.
+        'loss_probability': float((strategy_profits < 1.).mean()),
+        'underperform_probability': float((strategy_profits < hold_profits).mean()),
+    }
+
+
+def align_prices(series: List[list]) -> Tuple[list, np.ndarray]:
+    # Выравнивает ряды свечей нескольких инструментов по общему календарю.
+    # Пропуски заполняются последней известной ценой, а начало календаря
+    # сдвигается на дату, с которой есть цены всех инструментов.
+    dates = sorted({price.datetime for prices in series for price in prices})
+    positions = {dt: i for i, dt in enumerate(dates)}
+    matrix = np.full((len(dates), len(series)), np.nan)
+    for column, prices in enumerate(series):
+        rows = [positions[price.datetime] for price in prices]
+        matrix[rows, column] = [price.price_open for price in prices]
+
+    known = np.where(np.isnan(matrix), 0, np.arange(len(dates))[:, None])
+    np.maximum.accumulate(known, axis=0, out=known)
+    matrix = matrix[known, np.arange(len(series))]
+
+    complete = ~np.isnan(matrix).any(axis=1)
+    first = int(complete.argmax()) if complete.any() else len(dates)
+    return dates[first:], matrix[first:]
+
+
+def test_portfolio(
+        datetime_from,
+        datetime_to,
+        broker_token,
+        instrument_tickers,
+        strategy_code,
+        strategy_params
+) -> dict:
+    interval = DEFAULT_PRICE_INTERVAL
+
+    if not strategies.get(strategy_code):
+        raise ObjectNotFound('Strategy not found.')
+
+    instruments = [fetch_instrument(ticker, broker_token) for ticker in instrument_tickers]
+    dates, prices = align_prices([
+        fetch_prices(datetime_from, datetime_to, broker_token, instrument, interval, strategy_code)
+        for instrument in instruments
+    ])
+
+    try:
+        with stage('calculate'):
+            strategy_profits, hold_profits = strategies[strategy_code].calculate_portfolio(prices, strategy_params)
+    except NotImplementedError:
+        raise ValidationError('Strategy does not support portfolios.')
+    except (KeyError, ValueError):
+        raise ValidationError('Wrong strategy parameters.')
+
+    if strategy_profits is None or hold_profits is None:
+        raise ValidationError('Max strategy param value greater than period.')
+
+    # Портфель с равными долями: доходность — среднее доходностей инструментов.
+    return {
+        'strategy_profit': float(strategy_profits.mean()),
+        'hold_profit': float(hold_profits.mean()),
+        'results': [{
+            'instrument_ticker': ticker,
+            'strategy_profit': float(strategy_profit),
+            'hold_profit': float(hold_profit),
+        } for ticker, strategy_profit, hold_profit in zip(instrument_tickers, strategy_profits, hold_profits)]
+    }
+
+
 def get_top_results(from_: datetime, to_: datetime, strategy: str, instrument_ticker: str) -> List[dict]:
+    # Записываем отчёты, ожидающие в буфере, чтобы в выдаче были и только что посчитанные.
+    db.flush_reports()
     reports = db.get_top_reports(from_, to_, strategy, instrument_ticker)
     return [{
         'datetime': r[0],
@@ -201,6 +618,25 @@ def get_top_results(from_: datetime, to_: datetime, strategy: str, instrument_ti
     } for r in reports]
 
 
+def get_sweep_results(
+        datetime_from: datetime,
+        datetime_to: datetime,
+        strategy_code: str,
+        instrument_ticker: str
+) -> List[dict]:
+    instrument = db.get_instrument(ticker=instrument_ticker)
+    if instrument is None:
+        raise ObjectNotFound
+    results = db.get_sweep_results(
+        datetime_from, datetime_to, strategy_code, instrument.id, DEFAULT_PRICE_INTERVAL
+    )
+    return [{
+        'strategy_params': r[0],
+        'hold_profit': r[1],
+        'strategy_profit': r[2],
+    } for r in results]
+
+
 def get_prices(
         datetime_from: datetime,
         datetime_to: datetime,
@@ -225,3 +661,25 @@ def get_prices(
             for price in prices
         ]
     }
+
+
+def get_price_columns(
+        datetime_from: datetime,
+        datetime_to: datetime,
+        broker_token: str,
+        instrument_ticker: str,
+) -> dict:
+    # Колоночное представление свечей для компактных бинарных ответов.
+    instrument = fetch_instrument(instrument_ticker, broker_token)
+    prices = fetch_prices(datetime_from, datetime_to, broker_token, instrument, DEFAULT_PRICE_INTERVAL, None)
+    return {
+        'datetime_from': str(datetime_from),
+        'datetime_to': str(datetime_to),
+        'instrument_ticker': instrument_ticker,
+        'period': DEFAULT_PRICE_INTERVAL,
+        'time': [calendar.timegm(price.datetime.utctimetuple()) for price in prices],
+        'open': [price.price_open for price in prices],
+        'high': [price.price_max for price in prices],
+        'low': [price.price_min for price in prices],
+        'close': [price.price_close for price in prices],
+    }
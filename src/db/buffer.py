@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+from typing import Callable, List
+
+from sqlalchemy import exc
+
+
+FLUSH_INTERVAL = 1.
+FLUSH_SIZE = 500
+# Сколько строк буфер держит, пока БД недоступна. Сверх этого отбрасываются самые старые.
+MAX_ROWS = 50000
+# После стольких неудачных попыток подряд пачка делится, чтобы найти строки, которые не записываются.
+MAX_RETRIES = 5
+
+
+def is_transient_error(e: Exception) -> bool:
+    # Сбой соединения или таймаут: строки исправны, запись стоит повторить позже.
+    return isinstance(e, (exc.OperationalError, exc.InterfaceError)) or \
+        isinstance(e, exc.DBAPIError) and e.connection_invalidated
+
+
+class WriteBehindBuffer:
+    # Копит строки для вставки и записывает их пачкой в одной транзакции:
+    # по таймеру, при переполнении или при завершении процесса.
+    def __init__(self, model, session_factory: Callable, flush_interval: float = FLUSH_INTERVAL,
+                 flush_size: int = FLUSH_SIZE, max_rows: int = MAX_ROWS, max_retries: int = MAX_RETRIES):
+        self.model = model
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_rows = max_rows
+        self.max_retries = max_retries
+        self._rows = []
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(e)
+
+    def _trim(self):
+        overflow = len(self._rows) - self.max_rows
+        if overflow > 0:
+            logging.error('Write buffer of %s is full, dropping %d oldest rows.', self.model.__tablename__, overflow)
+            del self._rows[:overflow]
+
+    def add(self, row: dict):
+        with self._lock:
+            self._ensure_started()
+            self._rows.append(row)
+            self._trim()
+            if len(self._rows) >= self.flush_size:
+                self._wakeup.set()
+
+    def _insert(self, rows: List[dict]):
+        session = self.session_factory()
+        try:
+            session.bulk_insert_mappings(self.model, rows)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _insert_bisect(self, rows: List[dict]) -> List[dict]:
+        # Записывает пачку по частям. Строки, которые не записываются даже поодиночке,
+        # пишутся в лог и отбрасываются. Возвращает строки, оставшиеся незаписанными
+        # из-за временного сбоя.
+        try:
+            self._insert(rows)
+            return []
+        except Exception as e:
+            if is_transient_error(e):
+                return rows
+            if len(rows) == 1:
+                logging.error('Dropping %s row that cannot be written: %r (%s)', self.model.__tablename__, rows[0], e)
+                return []
+        middle = len(rows) // 2
+        rest = self._insert_bisect(rows[:middle])
+        if rest:
+            return rest + rows[middle:]
+        return self._insert_bisect(rows[middle:])
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return
+
+            try:
+                self._insert(rows)
+                self._failures = 0
+                return
+            except Exception as e:
+                error = e
+
+            # Ошибка в данных не исправится повтором, поэтому пачка сразу делится.
+            # Временный сбой повторяем, но не бесконечно.
+            self._failures += 1
+            if not is_transient_error(error) or self._failures >= self.max_retries:
+                rows = self._insert_bisect(rows)
+            if not rows:
+                self._failures = 0
+                return
+
+            # Возвращаем строки в буфер, чтобы не потерять их при временном сбое БД.
+            with self._lock:
+                self._rows[:0] = rows
+                self._trim()
+            raise error
@@ -1,19 +1,139 @@
+import contextvars
 import os
+import threading
+from contextlib import contextmanager
 from typing import List
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, create_engine, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import scoped_session, sessionmaker
+from .buffer import WriteBehindBuffer
 from .models import BaseModel
 from . import models
 
 
-engine = create_engine(os.environ.get('DB_URI'))
-BaseModel.metadata.bind = engine
-session = sessionmaker(bind=engine)()
+# Настройки пула соединений. Таймаут запроса задаётся в миллисекундах, 0 — без ограничения.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))
+
+
+def create_pooled_engine(uri: str):
+    return create_engine(
+        uri,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'}
+    )
+
+
+_engines = dict()
+_engines_lock = threading.Lock()
+
+
+def _get_engine(name: str, uri: str):
+    # Движки создаются при первом обращении к БД, а не при импорте модуля.
+    if name not in _engines:
+        with _engines_lock:
+            if name not in _engines:
+                _engines[name] = create_pooled_engine(uri)
+    return _engines[name]
+
+
+def get_engine():
+    engine = _get_engine('primary', os.environ.get('DB_URI'))
+    BaseModel.metadata.bind = engine
+    return engine
+
+
+def get_read_engine():
+    # Запросы только на чтение можно направить на реплику, указав DB_REPLICA_URI.
+    # Без реплики они выполняются на основной БД.
+    if os.environ.get('DB_REPLICA_URI'):
+        return _get_engine('replica', os.environ.get('DB_REPLICA_URI'))
+    return get_engine()
+
+
+def __getattr__(name):
+    if name == 'engine':
+        return get_engine()
+    if name == 'read_engine':
+        return get_read_engine()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+Session = sessionmaker()
+
+
+def create_session():
+    return Session(bind=get_engine())
+
+
+def _create_read_session():
+    if os.environ.get('DB_REPLICA_URI'):
+        return Session(bind=get_read_engine())
+    return session()
+
+
+# Область сессий: внутри session_scope (запрос API, запуск фоновой задачи) — своя,
+# вне её — поток. Объекты Session не потокобезопасны, поэтому общих сессий нет.
+_session_scope = contextvars.ContextVar('session_scope', default=None)
+
+
+def _get_scope():
+    scope = _session_scope.get()
+    return scope if scope is not None else threading.get_ident()
+
+
+session = scoped_session(create_session, scopefunc=_get_scope)
+read_session = scoped_session(_create_read_session, scopefunc=_get_scope)
+
+
+def close_sessions():
+    # Откатывает незавершённые транзакции (в том числе прерванные по statement_timeout)
+    # и возвращает соединения в пул.
+    read_session.remove()
+    session.remove()
+
+
+def enter_session_scope():
+    return _session_scope.set(object())
+
+
+def exit_session_scope(token):
+    _session_scope.reset(token)
+
+
+@contextmanager
+def session_scope():
+    token = enter_session_scope()
+    try:
+        yield
+    finally:
+        close_sessions()
+        exit_session_scope(token)
+
+# Отчёты пишутся в фоне пачками, чтобы не делать отдельный commit на каждый запрос.
+# Поэтому отчёт появляется в БД с задержкой до FLUSH_INTERVAL. Чтения, которым нужны
+# только что посчитанные отчёты, сначала вызывают flush_reports. Для get_report в
+# _fetch_prices задержка не важна: загруженность свечей проверяется по price_coverage,
+# которая пишется синхронно.
+report_buffer = WriteBehindBuffer(models.TestReport, create_session)
+checkpoint_buffer = WriteBehindBuffer(models.TestCheckpoint, create_session)
+
+
+def try_advisory_lock(connection, lock_id: int) -> bool:
+    # Сессионная блокировка Postgres: удерживается, пока открыто соединение.
+    return bool(connection.execute(select([func.pg_try_advisory_lock(lock_id)])).scalar())
 
 
 def get_top_reports(datetime_from=None, datetime_to=None, strategy=None, instrument_ticker=None):
-    result = session.query(
+    result = read_session.query(
         models.TestReport.datetime,
         models.TestReport.datetime_from,
         models.TestReport.datetime_to,
@@ -44,7 +164,7 @@ def get_top_reports(datetime_from=None, datetime_to=None, strategy=None, instrum
 
 
 def get_report(datetime_from, datetime_to, strategy, financial_instrument_id, interval):
-    return session.query(models.TestReport).filter(
+    return read_session.query(models.TestReport).filter(
         models.TestReport.strategy == strategy,
         models.TestReport.financial_instrument_id == financial_instrument_id,
         models.TestReport.datetime_from <= datetime_from,
@@ -54,7 +174,7 @@ def get_report(datetime_from, datetime_to, strategy, financial_instrument_id, in
 
 
 def get_instrument(ticker):
-    return session.query(models.FinancialInstrument).filter(
+    return read_session.query(models.FinancialInstrument).filter(
         models.FinancialInstrument.ticker == ticker
     ).first()
 
@@ -81,7 +201,7 @@ def write_report(
     strategy_profit,
     financial_instrument_id
 ):
-    session.add(models.TestReport(
+    report_buffer.add(dict(
         datetime=datetime,
         datetime_from=datetime_from,
         datetime_to=datetime_to,
@@ -91,21 +211,159 @@ def write_report(
         strategy_profit=strategy_profit,
         financial_instrument_id=financial_instrument_id
     ))
+
+
+def flush_reports():
+    report_buffer.flush()
+    checkpoint_buffer.flush()
+
+
+def get_checkpoint(datetime_from, datetime_to, strategy, strategy_params, financial_instrument_id, interval):
+    # Самый поздний чекпоинт того же расчёта, не выходящий за конец запрошенного периода.
+    return read_session.query(models.TestCheckpoint).filter(
+        models.TestCheckpoint.financial_instrument_id == financial_instrument_id,
+        models.TestCheckpoint.strategy == strategy,
+        models.TestCheckpoint.interval == interval,
+        models.TestCheckpoint.strategy_params == strategy_params,
+        models.TestCheckpoint.datetime_from == datetime_from,
+        models.TestCheckpoint.datetime_to <= datetime_to
+    ).order_by(models.TestCheckpoint.datetime_to.desc()).first()
+
+
+def write_checkpoint(
+    datetime,
+    datetime_from,
+    datetime_to,
+    strategy,
+    interval,
+    strategy_params,
+    price_datetime,
+    state,
+    financial_instrument_id
+):
+    checkpoint_buffer.add(dict(
+        datetime=datetime,
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        strategy=strategy,
+        interval=interval,
+        strategy_params=strategy_params,
+        price_datetime=price_datetime,
+        state=state,
+        financial_instrument_id=financial_instrument_id
+    ))
+
+
+def get_sweep_results(datetime_from, datetime_to, strategy, financial_instrument_id, interval):
+    return read_session.query(
+        models.SweepResult.strategy_params,
+        models.SweepResult.hold_profit,
+        models.SweepResult.strategy_profit,
+    ).filter(
+        models.SweepResult.strategy == strategy,
+        models.SweepResult.financial_instrument_id == financial_instrument_id,
+        models.SweepResult.datetime_from == datetime_from,
+        models.SweepResult.datetime_to == datetime_to,
+        models.SweepResult.interval == interval
+    ).all()
+
+
+def write_sweep_results(
+    datetime,
+    datetime_from,
+    datetime_to,
+    strategy,
+    interval,
+    results,
+    financial_instrument_id
+):
+    # Все точки перебора записываются одной пачкой в одной транзакции.
+    _add_sweep_results(datetime, datetime_from, datetime_to, strategy, interval, results, financial_instrument_id)
     session.commit()
 
 
-def get_prices(datetime_from, datetime_to, financial_instrument_id, interval):
-    return session.query(models.PriceCandle).filter(
+def _add_sweep_results(
+    datetime,
+    datetime_from,
+    datetime_to,
+    strategy,
+    interval,
+    results,
+    financial_instrument_id
+):
+    session.bulk_insert_mappings(models.SweepResult, [
+        dict(
+            datetime=datetime,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            strategy=strategy,
+            interval=interval,
+            strategy_params=r['strategy_params'],
+            hold_profit=r['hold_profit'],
+            strategy_profit=r['strategy_profit'],
+            financial_instrument_id=financial_instrument_id
+        ) for r in results
+    ])
+
+
+def get_prices(datetime_from, datetime_to, financial_instrument_id, interval, use_primary=False):
+    # Сразу после записи свечей читаем с основной БД, так как реплика может отставать.
+    # Возвращаются строки значений, а не объекты ORM: их можно передавать другим потокам.
+    return (session if use_primary else read_session).query(
+        models.PriceCandle.datetime,
+        models.PriceCandle.interval,
+        models.PriceCandle.price_open,
+        models.PriceCandle.price_close,
+        models.PriceCandle.price_max,
+        models.PriceCandle.price_min,
+    ).filter(
         models.PriceCandle.financial_instrument_id == financial_instrument_id,
         models.PriceCandle.interval == interval,
         models.PriceCandle.datetime >= datetime_from,
         models.PriceCandle.datetime <= datetime_to
-    ).distinct(models.PriceCandle.datetime).order_by(models.PriceCandle.datetime).all()
+    ).order_by(models.PriceCandle.datetime).all()
+
+
+def get_price_coverage(financial_instrument_id, interval, datetime_from=None, datetime_to=None):
+    result = read_session.query(models.PriceCoverage).filter(
+        models.PriceCoverage.financial_instrument_id == financial_instrument_id,
+        models.PriceCoverage.interval == interval
+    )
+    if datetime_from:
+        result = result.filter(models.PriceCoverage.datetime_to >= datetime_from)
+    if datetime_to:
+        result = result.filter(models.PriceCoverage.datetime_from <= datetime_to)
+    return result.order_by(models.PriceCoverage.datetime_from).all()
+
+
+def _add_price_coverage(financial_instrument_id, interval, datetime_from, datetime_to):
+    # Продлеваем период, с которым новый смыкается, вместо добавления новой строки,
+    # чтобы частые небольшие записи не раздували таблицу покрытия.
+    coverage = session.query(models.PriceCoverage).filter(
+        models.PriceCoverage.financial_instrument_id == financial_instrument_id,
+        models.PriceCoverage.interval == interval,
+        models.PriceCoverage.datetime_from <= datetime_from,
+        models.PriceCoverage.datetime_to >= datetime_from
+    ).order_by(models.PriceCoverage.datetime_to.desc()).first()
+    if coverage is None:
+        session.add(models.PriceCoverage(
+            financial_instrument_id=financial_instrument_id,
+            interval=interval,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to
+        ))
+    elif coverage.datetime_to < datetime_to:
+        coverage.datetime_to = datetime_to
 
 
-def write_prices(prices, financial_instrument_id, interval):
-    session.bulk_save_objects([
-        models.PriceCandle(
+def _add_prices(prices, financial_instrument_id, interval, datetime_from=None, datetime_to=None):
+    # Вместе со свечами запоминаем, за какой период они загружены целиком.
+    if datetime_from and datetime_to:
+        _add_price_coverage(financial_instrument_id, interval, datetime_from, datetime_to)
+    # Свеча с тем же временем заменяется: незавершённая свеча, загруженная раньше,
+    # перезаписывается завершённой.
+    rows = {
+        p['time']: dict(
             financial_instrument_id=financial_instrument_id,
             interval=interval,
             datetime=p['time'],
@@ -114,5 +372,201 @@ def write_prices(prices, financial_instrument_id, interval):
             price_max=p['h'],
             price_min=p['l'],
         ) for p in prices
+    }
+    if not rows:
+        return
+    statement = insert(models.PriceCandle.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['financial_instrument_id', 'interval', 'datetime'],
+        set_={
+            column: statement.excluded[column]
+            for column in ('price_open', 'price_close', 'price_max', 'price_min')
+        }
+    )
+    session.execute(statement, list(rows.values()))
+
+
+def write_prices(prices, financial_instrument_id, interval, datetime_from=None, datetime_to=None):
+    _add_prices(prices, financial_instrument_id, interval, datetime_from, datetime_to)
+    session.commit()
+
+
+def write_price_batches(batches):
+    # Записывает свечи нескольких инструментов одной транзакцией.
+    # Каждая пачка — словарь с аргументами write_prices.
+    for batch in batches:
+        _add_prices(**batch)
+    session.commit()
+
+
+def create_sweep_job(
+    datetime,
+    datetime_from,
+    datetime_to,
+    strategy,
+    interval,
+    financial_instrument_id,
+    shards
+):
+    job = models.SweepJob(
+        datetime=datetime,
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        strategy=strategy,
+        interval=interval,
+        status=models.SweepStatus.pending,
+        financial_instrument_id=financial_instrument_id
+    )
+    session.add(job)
+    session.flush()
+    session.bulk_insert_mappings(models.SweepShard, [
+        dict(sweep_job_id=job.id, param_ranges=param_ranges, status=models.SweepStatus.pending)
+        for param_ranges in shards
     ])
     session.commit()
+    return job
+
+
+def get_sweep_job(job_id):
+    return session.query(models.SweepJob).filter(models.SweepJob.id == job_id).first()
+
+
+def get_sweep_job_progress(job_id):
+    return dict(session.query(
+        models.SweepShard.status,
+        func.count(models.SweepShard.id)
+    ).filter(
+        models.SweepShard.sweep_job_id == job_id
+    ).group_by(models.SweepShard.status).all())
+
+
+def claim_sweep_shard(worker, claimed_at, claimed_before, max_attempts):
+    # SKIP LOCKED позволяет нескольким воркерам забирать шарды одновременно,
+    # не дожидаясь друг друга. Шарды, взятые давно (до claimed_before),
+    # считаются брошенными упавшим воркером и выдаются повторно,
+    # пока не исчерпано max_attempts попыток.
+    while True:
+        shard = session.query(models.SweepShard).filter(or_(
+            models.SweepShard.status == models.SweepStatus.pending,
+            and_(
+                models.SweepShard.status == models.SweepStatus.running,
+                models.SweepShard.claimed_at < claimed_before
+            )
+        )).order_by(models.SweepShard.id).with_for_update(skip_locked=True).first()
+        if shard is None:
+            session.commit()
+            return None
+
+        if shard.attempts >= max_attempts:
+            shard.status = models.SweepStatus.failed
+            job_id = shard.sweep_job_id
+            session.commit()
+            reduce_sweep_job(job_id)
+            continue
+
+        shard.status = models.SweepStatus.running
+        shard.worker = worker
+        shard.claimed_at = claimed_at
+        shard.attempts += 1
+        session.commit()
+        return shard
+
+
+def _update_claimed_shard(shard_id, worker, values: dict) -> bool:
+    # Шард меняет только воркер, который держит его сейчас: после повторной выдачи
+    # зависшего шарда результат прежнего воркера отбрасывается.
+    return session.query(models.SweepShard).filter(
+        models.SweepShard.id == shard_id,
+        models.SweepShard.worker == worker,
+        models.SweepShard.status == models.SweepStatus.running
+    ).update(values, synchronize_session=False) == 1
+
+
+def touch_sweep_shard(shard_id, worker, claimed_at) -> bool:
+    # Продлевает шард, который воркер ещё считает, чтобы его не сочли брошенным.
+    touched = _update_claimed_shard(shard_id, worker, dict(claimed_at=claimed_at))
+    session.commit()
+    return touched
+
+
+def finish_sweep_shard(shard_id, worker, strategy_params, strategy_profit, hold_profit, results) -> bool:
+    # Результаты перебора записываются в одной транзакции с завершением шарда,
+    # чтобы их не записали оба воркера, считавшие один шард.
+    finished = _update_claimed_shard(shard_id, worker, dict(
+        status=models.SweepStatus.done,
+        strategy_params=strategy_params,
+        strategy_profit=strategy_profit,
+        hold_profit=hold_profit
+    ))
+    if finished and results:
+        job = session.query(models.SweepJob).join(
+            models.SweepShard, models.SweepShard.sweep_job_id == models.SweepJob.id
+        ).filter(models.SweepShard.id == shard_id).one()
+        _add_sweep_results(
+            datetime=job.datetime,
+            datetime_from=job.datetime_from,
+            datetime_to=job.datetime_to,
+            strategy=job.strategy,
+            interval=job.interval,
+            results=results,
+            financial_instrument_id=job.financial_instrument_id
+        )
+    session.commit()
+    return finished
+
+
+def release_sweep_shard(shard_id, worker, max_attempts) -> bool:
+    # Возвращает шард после ошибки: его сразу возьмёт следующий воркер,
+    # а после max_attempts попыток шард помечается неудачным.
+    shard = session.query(models.SweepShard).filter(models.SweepShard.id == shard_id).one()
+    failed = shard.attempts >= max_attempts
+    released = _update_claimed_shard(shard_id, worker, dict(
+        status=models.SweepStatus.failed if failed else models.SweepStatus.pending,
+        worker=None,
+        claimed_at=None
+    ))
+    session.commit()
+    return released and failed
+
+
+def reduce_sweep_job(job_id):
+    # Блокировка строки задачи гарантирует, что итоговый отчёт запишет ровно один воркер.
+    job = session.query(models.SweepJob).filter(
+        models.SweepJob.id == job_id
+    ).with_for_update().first()
+    if job is None or job.status == models.SweepStatus.done:
+        session.commit()
+        return job
+
+    shards = session.query(models.SweepShard).filter(models.SweepShard.sweep_job_id == job_id).all()
+    finished = (models.SweepStatus.done, models.SweepStatus.failed)
+    if any(shard.status not in finished for shard in shards):
+        job.status = models.SweepStatus.running
+        session.commit()
+        return job
+
+    # Без результатов неудачных шардов лучшие параметры неизвестны, отчёт не пишется.
+    if any(shard.status == models.SweepStatus.failed for shard in shards):
+        job.status = models.SweepStatus.failed
+        session.commit()
+        return job
+
+    results = [shard for shard in shards if shard.strategy_params is not None]
+    job.status = models.SweepStatus.done
+    if results:
+        best = max(results, key=lambda shard: shard.strategy_profit)
+        job.strategy_params = best.strategy_params
+        job.strategy_profit = best.strategy_profit
+        job.hold_profit = best.hold_profit
+        session.add(models.TestReport(
+            datetime=job.datetime,
+            datetime_from=job.datetime_from,
+            datetime_to=job.datetime_to,
+            strategy=job.strategy,
+            interval=job.interval,
+            hold_profit=best.hold_profit,
+            strategy_profit=best.strategy_profit,
+            financial_instrument_id=job.financial_instrument_id
+        ))
+    session.commit()
+    return job
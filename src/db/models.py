@@ -1,6 +1,6 @@
 from enum import Enum
 
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy import types
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -49,6 +49,35 @@ class PriceCandle(BaseModel):
         backref='price_candles'
     )
 
+    __table_args__ = (
+        # Одна свеча на момент времени: повторная загрузка обновляет её, а не дублирует.
+        Index('ix_price_candle_unique', 'financial_instrument_id', 'interval', 'datetime', unique=True),
+    )
+
+
+class PriceCoverage(BaseModel):
+    __tablename__ = 'price_coverage'
+
+    id = Column(types.Integer, primary_key=True)
+    datetime_from = Column(types.DateTime, nullable=False)
+    datetime_to = Column(types.DateTime, nullable=False)
+    interval = Column(types.String(5), nullable=False, default='1min')
+    financial_instrument_id = Column(
+        types.Integer,
+        ForeignKey('financial_instrument.id', ondelete='CASCADE'),
+        nullable=False
+    )
+
+    financial_instrument = relationship(
+        'FinancialInstrument',
+        cascade='all, delete',
+        backref='price_coverages'
+    )
+
+    __table_args__ = (
+        Index('ix_price_coverage_lookup', 'financial_instrument_id', 'interval', 'datetime_from'),
+    )
+
 
 class TestReport(BaseModel):
     __tablename__ = 'test_report'
@@ -72,3 +101,137 @@ class TestReport(BaseModel):
         cascade='all, delete',
         backref='test_reports'
     )
+
+
+class TestCheckpoint(BaseModel):
+    __tablename__ = 'test_checkpoint'
+
+    id = Column(types.Integer, primary_key=True)
+    datetime = Column(types.DateTime, nullable=False)
+    datetime_from = Column(types.DateTime, nullable=False)
+    datetime_to = Column(types.DateTime, nullable=False)
+    strategy = Column(types.String(16), nullable=False)
+    interval = Column(types.String(5), nullable=False, default='1min')
+    # Параметры в виде JSON с отсортированными ключами, чтобы искать чекпоинт по равенству.
+    strategy_params = Column(types.String(255), nullable=False)
+    # Время последней обработанной свечи, с которой продолжается расчёт.
+    price_datetime = Column(types.DateTime, nullable=False)
+    # Состояние стратегии после последней обработанной свечи.
+    state = Column(types.JSON, nullable=False)
+    financial_instrument_id = Column(
+        types.Integer,
+        ForeignKey('financial_instrument.id', ondelete='CASCADE'),
+        nullable=False
+    )
+
+    financial_instrument = relationship(
+        'FinancialInstrument',
+        cascade='all, delete',
+        backref='test_checkpoints'
+    )
+
+    __table_args__ = (
+        Index(
+            'ix_test_checkpoint_lookup',
+            'financial_instrument_id', 'strategy', 'interval', 'strategy_params', 'datetime_from', 'datetime_to'
+        ),
+    )
+
+
+class SweepResult(BaseModel):
+    __tablename__ = 'sweep_result'
+
+    id = Column(types.Integer, primary_key=True)
+    datetime = Column(types.DateTime, nullable=False)
+    datetime_from = Column(types.DateTime, nullable=False)
+    datetime_to = Column(types.DateTime, nullable=False)
+    strategy = Column(types.String(16), nullable=False)
+    interval = Column(types.String(5), nullable=False, default='1min')
+    strategy_params = Column(types.JSON, nullable=False)
+    hold_profit = Column(types.Float, nullable=False)
+    strategy_profit = Column(types.Float, nullable=False)
+    financial_instrument_id = Column(
+        types.Integer,
+        ForeignKey('financial_instrument.id', ondelete='CASCADE'),
+        nullable=False
+    )
+
+    financial_instrument = relationship(
+        'FinancialInstrument',
+        cascade='all, delete',
+        backref='sweep_results'
+    )
+
+    __table_args__ = (
+        Index(
+            'ix_sweep_result_lookup',
+            'financial_instrument_id', 'strategy', 'interval', 'datetime_from', 'datetime_to'
+        ),
+    )
+
+
+class SweepStatus(Enum):
+    pending = 0
+    running = 1
+    done = 2
+    failed = 3
+
+    def __str__(self):
+        return self.name
+
+
+class SweepJob(BaseModel):
+    __tablename__ = 'sweep_job'
+
+    id = Column(types.Integer, primary_key=True)
+    datetime = Column(types.DateTime, nullable=False)
+    datetime_from = Column(types.DateTime, nullable=False)
+    datetime_to = Column(types.DateTime, nullable=False)
+    strategy = Column(types.String(16), nullable=False)
+    interval = Column(types.String(5), nullable=False, default='1min')
+    status = Column(types.Enum(SweepStatus), nullable=False, default=SweepStatus.pending)
+    strategy_params = Column(types.JSON, nullable=True)
+    hold_profit = Column(types.Float, nullable=True)
+    strategy_profit = Column(types.Float, nullable=True)
+    financial_instrument_id = Column(
+        types.Integer,
+        ForeignKey('financial_instrument.id', ondelete='CASCADE'),
+        nullable=False
+    )
+
+    financial_instrument = relationship(
+        'FinancialInstrument',
+        cascade='all, delete',
+        backref='sweep_jobs'
+    )
+
+
+class SweepShard(BaseModel):
+    __tablename__ = 'sweep_shard'
+
+    id = Column(types.Integer, primary_key=True)
+    # Диапазоны параметров, которые перебирает шард.
+    param_ranges = Column(types.JSON, nullable=False)
+    status = Column(types.Enum(SweepStatus), nullable=False, default=SweepStatus.pending)
+    worker = Column(types.String(64), nullable=True)
+    claimed_at = Column(types.DateTime, nullable=True)
+    # Сколько раз шард выдавался воркерам. После SWEEP_MAX_ATTEMPTS шард считается неудачным.
+    attempts = Column(types.Integer, nullable=False, default=0, server_default='0')
+    strategy_params = Column(types.JSON, nullable=True)
+    hold_profit = Column(types.Float, nullable=True)
+    strategy_profit = Column(types.Float, nullable=True)
+    sweep_job_id = Column(
+        types.Integer,
+        ForeignKey('sweep_job.id', ondelete='CASCADE'),
+        nullable=False
+    )
+
+    sweep_job = relationship(
+        'SweepJob',
+        cascade='all, delete',
+        backref='shards'
+    )
+
+    __table_args__ = (
+        Index('ix_sweep_shard_status', 'status', 'id'),
+    )
@@ -0,0 +1,204 @@
+"""Сервис непрерывной загрузки свечей.
+
+Подписывается на поток свечей по инструментам из INGEST_INSTRUMENTS, копит
+завершённые свечи и записывает их в price_candle пачками. После каждого
+(пере)подключения догружает пропущенные свечи через get_prices.
+
+    DB_URI=postgresql://... INGEST_INSTRUMENTS=SBER,GAZP INGEST_TOKEN=... python -m src.ingest
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from . import core
+from .brokers import CandleFeedAbstract
+from .brokers.offline_adapter import OfflineCandleFeed
+from .brokers.tinkoff_stream import TinkoffCandleFeed
+from .db import db
+
+
+INGEST_INSTRUMENTS = [t.strip() for t in os.environ.get('INGEST_INSTRUMENTS', '').split(',') if t.strip()]
+INGEST_TOKEN = os.environ.get('INGEST_TOKEN', '')
+INGEST_FEED = os.environ.get('INGEST_FEED', 'tinkoff')
+# По умолчанию загружаются свечи того интервала, по которому считает API,
+# иначе запросы продолжат загружать свечи у брокера.
+INGEST_INTERVAL = os.environ.get('INGEST_INTERVAL', core.DEFAULT_PRICE_INTERVAL)
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 1))
+# Максимум завершённых свечей, ожидающих записи. При переполнении чтение
+# из потока приостанавливается, пока запись не догонит.
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+# За сколько часов догружается история инструмента, по которому ещё нет свечей.
+INGEST_CATCHUP_HOURS = int(os.environ.get('INGEST_CATCHUP_HOURS', 24))
+RECONNECT_DELAY_MAX = 60.
+
+feeds = {
+    'tinkoff': TinkoffCandleFeed,
+    'offline': OfflineCandleFeed,
+}
+
+
+class CandleIngestor:
+    def __init__(
+            self,
+            feed: CandleFeedAbstract,
+            broker_token: str,
+            instruments: list,
+            interval: str = INGEST_INTERVAL,
+            batch_size: int = INGEST_BATCH_SIZE,
+            flush_interval: float = INGEST_FLUSH_INTERVAL,
+            queue_size: int = INGEST_QUEUE_SIZE
+    ):
+        self.feed = feed
+        self.broker_token = broker_token
+        self.instruments = {instrument.figi: instrument for instrument in instruments}
+        self.interval = interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        # Последнее обновление текущей (ещё не завершённой) свечи по каждому инструменту.
+        self._current = dict()
+        # До какого момента свечи инструмента записаны без пропусков.
+        self._covered_to = dict()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def catch_up(self):
+        now = datetime.now(pytz.UTC)
+        broker_client = core.get_or_create_client(self.broker_token)
+        for figi, instrument in self.instruments.items():
+            with db.session_scope():
+                coverage = db.get_price_coverage(instrument.id, self.interval)
+                datetime_from = now - timedelta(hours=INGEST_CATCHUP_HOURS)
+                if coverage:
+                    datetime_from = max(datetime_from, pytz.UTC.localize(max(c.datetime_to for c in coverage)))
+                # Последняя записанная свеча и текущая незавершённая загружаются повторно:
+                # запись свечей обновляет существующие, а завершённая версия придёт из потока.
+                if datetime_from < now:
+                    core.load_prices(broker_client, instrument, self.interval, datetime_from, now)
+            self._covered_to[figi] = core.to_naive_utc(now)
+            self._current.pop(figi, None)
+
+    def handle(self, candle: dict):
+        figi = candle['figi']
+        if figi not in self.instruments:
+            return
+        current = self._current.get(figi)
+        if current is not None and candle['time'] > current['time']:
+            # Пришла следующая свеча — предыдущая завершена, а других свечей между ними нет.
+            # Если запись отстаёт, put блокируется и чтение потока приостанавливается.
+            self.queue.put((current, candle['time']))
+        if current is None or candle['time'] >= current['time']:
+            self._current[figi] = candle
+
+    def flush(self, candles: list):
+        # Берём последнее обновление каждой свечи и пишем все инструменты одной транзакцией.
+        # Свечи приходят парами (свеча, время следующей свечи): период покрыт до начала
+        # следующей свечи, то есть включая завершённую свечу целиком.
+        grouped = dict()
+        next_times = dict()
+        for candle, next_time in candles:
+            figi = candle['figi']
+            grouped.setdefault(figi, dict())[candle['time']] = candle
+            next_times[figi] = max(next_times.get(figi, next_time), next_time)
+
+        batches = []
+        covered_to = dict()
+        for figi, prices in grouped.items():
+            datetime_to = core.to_naive_utc(next_times[figi])
+            batches.append(dict(
+                prices=list(prices.values()),
+                financial_instrument_id=self.instruments[figi].id,
+                interval=self.interval,
+                datetime_from=min(self._covered_to.get(figi, datetime_to), datetime_to),
+                datetime_to=datetime_to
+            ))
+            covered_to[figi] = max(self._covered_to.get(figi, datetime_to), datetime_to)
+        with db.session_scope():
+            db.write_price_batches(batches)
+        self._covered_to.update(covered_to)
+
+    def read(self):
+        delay = 1.
+        while not self._stopped.is_set():
+            try:
+                # Сначала подписываемся, затем догружаем пропущенное: обновления,
+                # пришедшие во время догрузки, дождутся чтения в буфере соединения.
+                self.feed.subscribe(list(self.instruments), self.interval)
+                self.catch_up()
+                delay = 1.
+                while not self._stopped.is_set():
+                    self.handle(self.feed.receive())
+            except Exception as e:
+                if isinstance(e, ConnectionError):
+                    logging.warning('Candle feed disconnected: %s', e)
+                else:
+                    logging.exception(e)
+                self.feed.close()
+                self._stopped.wait(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def _collect(self) -> list:
+        candles = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(candles) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                candles.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return candles
+
+    def write(self):
+        failed = []
+        while not self._stopped.is_set() or not self.queue.empty():
+            # Неудачно записанную пачку повторяем, прежде чем брать новые свечи.
+            candles = failed or self._collect()
+            if not candles:
+                continue
+            try:
+                self.flush(candles)
+                failed = []
+            except Exception as e:
+                logging.exception(e)
+                if self._stopped.is_set():
+                    break
+                failed = candles
+                self._stopped.wait(self.flush_interval)
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self.read, daemon=True),
+            threading.Thread(target=self.write, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self.feed.close()
+        for thread in self._threads:
+            thread.join()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    instruments = [core.fetch_instrument(ticker, INGEST_TOKEN) for ticker in INGEST_INSTRUMENTS]
+    ingestor = CandleIngestor(feeds[INGEST_FEED](INGEST_TOKEN), INGEST_TOKEN, instruments)
+    ingestor.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        ingestor.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Предзагрузка свечей для списка наблюдения.
+
+Запускается планировщиком внутри приложения после закрытия рынка или вручную
+(например, из cron):
+
+    DB_URI=postgresql://... WATCHLIST=SBER,GAZP WATCHLIST_TOKEN=... python -m src.prefetch
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+
+from . import core
+from .db import db
+from .strategy_register import strategies
+
+
+WATCHLIST = [ticker.strip() for ticker in os.environ.get('WATCHLIST', '').split(',') if ticker.strip()]
+WATCHLIST_TOKEN = os.environ.get('WATCHLIST_TOKEN', '')
+# За сколько дней загружается история инструмента, которого ещё нет в БД.
+WATCHLIST_HISTORY_DAYS = int(os.environ.get('WATCHLIST_HISTORY_DAYS', 3 * 365))
+# Время запуска предзагрузки (UTC), по умолчанию — после закрытия Московской биржи.
+PREFETCH_AT = os.environ.get('PREFETCH_AT', '16:00')
+PREFETCH_SCHEDULER = os.environ.get('PREFETCH_SCHEDULER', '1') == '1'
+# Ключ advisory-блокировки Postgres, которой выбирается единственный процесс,
+# выполняющий предзагрузку, когда приложение запущено в нескольких воркерах.
+PREFETCH_LOCK_ID = int(os.environ.get('PREFETCH_LOCK_ID', 7300001))
+
+
+def prefetch_instrument(ticker: str, broker_token: str, now: datetime) -> int:
+    interval = core.DEFAULT_PRICE_INTERVAL
+    instrument = core.fetch_instrument(ticker, broker_token)
+
+    # Догружаем свечи с конца уже загруженного периода.
+    datetime_from = now - timedelta(days=WATCHLIST_HISTORY_DAYS)
+    coverage = db.get_price_coverage(instrument.id, interval, core.to_naive_utc(datetime_from))
+    if coverage:
+        datetime_from = max(datetime_from, pytz.UTC.localize(max(c.datetime_to for c in coverage)))
+    if datetime_from >= now:
+        return 0
+
+    prices = core.load_prices(
+        core.get_or_create_client(broker_token), instrument, interval, datetime_from, now
+    )
+    return len(prices)
+
+
+def prefetch_watchlist(watchlist=None, broker_token=None) -> dict:
+    watchlist = WATCHLIST if watchlist is None else watchlist
+    broker_token = WATCHLIST_TOKEN if broker_token is None else broker_token
+    now = datetime.now(pytz.UTC)
+    result = dict()
+    for ticker in watchlist:
+        try:
+            # Своя сессия на каждый инструмент: ошибка по одному не затрагивает остальные.
+            with db.session_scope():
+                result[ticker] = prefetch_instrument(ticker, broker_token, now)
+        except Exception as e:
+            logging.exception(e)
+            result[ticker] = None
+    return result
+
+
+def warm_up(watchlist=None, broker_token=None):
+    # Загружаем модули стратегий, создаём клиента брокера и находим инструменты,
+    # чтобы первые запросы не платили за это.
+    watchlist = WATCHLIST if watchlist is None else watchlist
+    broker_token = WATCHLIST_TOKEN if broker_token is None else broker_token
+    for code in strategies:
+        strategies[code]
+    if not watchlist:
+        return
+    core.get_or_create_client(broker_token)
+    for ticker in watchlist:
+        try:
+            with db.session_scope():
+                core.fetch_instrument(ticker, broker_token)
+        except Exception as e:
+            logging.exception(e)
+
+
+def seconds_until(at: str, now: datetime) -> float:
+    hour, minute = (int(part) for part in at.split(':'))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+class PrefetchScheduler(threading.Thread):
+    # Планировщик запускается в каждом воркере uvicorn, но предзагрузку выполняет только
+    # процесс, удерживающий advisory-блокировку. Блокировка держится соединением на всё время
+    # работы процесса и освобождается Postgres при его завершении.
+    def __init__(self, at: str = PREFETCH_AT, lock_id: int = PREFETCH_LOCK_ID):
+        super().__init__(daemon=True)
+        self.at = at
+        self.lock_id = lock_id
+        self._lock_connection = None
+        self._stopped = threading.Event()
+
+    def _elect(self) -> bool:
+        # Повторный захват на том же соединении проходит, если блокировка всё ещё наша,
+        # и заодно проверяет, что соединение живо.
+        try:
+            if self._lock_connection is None:
+                self._lock_connection = db.get_engine().connect()
+            if db.try_advisory_lock(self._lock_connection, self.lock_id):
+                return True
+        except Exception as e:
+            logging.exception(e)
+        self._release()
+        return False
+
+    def _release(self):
+        if self._lock_connection is not None:
+            try:
+                self._lock_connection.close()
+            except Exception as e:
+                logging.exception(e)
+            self._lock_connection = None
+
+    def run(self):
+        while not self._stopped.wait(seconds_until(self.at, datetime.now(pytz.UTC))):
+            if self._elect():
+                logging.info('Watchlist prefetch: %s', prefetch_watchlist())
+            else:
+                logging.info('Watchlist prefetch is run by another process.')
+        self._release()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def main():
+    warm_up()
+    print(prefetch_watchlist())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+from typing import Optional
+
+import numpy as np
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def block_bootstrap(prices, samples: int, block_size: int, seed: Optional[int] = None) -> np.ndarray:
+    # Строит samples искусственных рядов той же длины, склеивая случайные блоки
+    # логарифмических доходностей исходного ряда (кольцевой блочный бутстрап).
+    # Блоки сохраняют автокорреляцию доходностей внутри себя.
+    # Результат — матрица (время x выборки), все ряды начинаются с исходной цены.
+    prices = np.asarray(prices, dtype=np.float64)
+    returns = np.diff(np.log(prices))
+    length = len(returns)
+    block_size = max(1, min(block_size, length))
+    blocks_count = -(-length // block_size)
+
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, length, size=(samples, blocks_count))
+    indexes = (starts[:, :, None] + np.arange(block_size)) % length
+    sampled = returns[indexes.reshape(samples, -1)[:, :length]].T
+
+    paths = np.empty((length + 1, samples))
+    paths[0] = 0.
+    np.cumsum(sampled, axis=0, out=paths[1:])
+    return prices[0] * np.exp(paths)
+
+
+def describe(values: np.ndarray) -> dict:
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'percentiles': {str(q): float(p) for q, p in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+    }
@@ -0,0 +1,44 @@
+import threading
+from typing import Callable, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Объединяет одновременные вызовы с одинаковым ключом: функцию выполняет
+    # только первый вызвавший, остальные дожидаются и получают его результат
+    # (или его исключение). Результат получают несколько потоков сразу,
+    # поэтому func должна возвращать неизменяемые значения.
+    def __init__(self):
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
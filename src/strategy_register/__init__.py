@@ -1,6 +1,10 @@
 from ._strategy_register import *
-from .ama import StrategyAMA
 
-strategies = {
-    "AMA": StrategyAMA(),
-}
+strategies = StrategyRegistry(__name__, __path__)
+
+
+def __getattr__(name):
+    # Классы стратегий доступны из пакета, но их модули загружаются лениво.
+    if name == 'StrategyAMA':
+        return type(strategies['AMA'])
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,218 @@
+import contextvars
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+
+CACHE_MAX_SIZE = 256
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+# Внутри no_cache индикаторы, включая вложенные, считаются без кэша.
+_cache_enabled = contextvars.ContextVar('indicator_cache_enabled', default=True)
+
+
+def as_series(prices) -> np.ndarray:
+    if isinstance(prices, np.ndarray) and prices.dtype == np.float64:
+        return prices
+    return np.asarray(prices, dtype=np.float64)
+
+
+def series_key(prices) -> Hashable:
+    # Ключ ряда строится по его содержимому, поэтому разные стратегии,
+    # получившие одинаковые цены, попадают в одни и те же записи кэша.
+    series = as_series(prices)
+    return series.shape, hashlib.blake2b(series.tobytes(), digest_size=16).hexdigest()
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+@contextmanager
+def no_cache():
+    # Для одноразовых рядов (например, бутстреп-выборок): их результаты никогда
+    # не понадобятся повторно и только вытеснили бы из кэша полезные записи.
+    token = _cache_enabled.set(False)
+    try:
+        yield
+    finally:
+        _cache_enabled.reset(token)
+
+
+def _nbytes(result) -> int:
+    if isinstance(result, tuple):
+        return sum(r.nbytes for r in result)
+    return result.nbytes
+
+
+def cached(name: str):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(prices, *params, key: Optional[Hashable] = None):
+            global _cache_bytes
+            series = as_series(prices)
+            if not _cache_enabled.get():
+                return func(series, *params)
+            cache_key = (key if key is not None else series_key(series), name, params)
+            with _cache_lock:
+                if cache_key in _cache:
+                    _cache.move_to_end(cache_key)
+                    return _cache[cache_key]
+
+            result = func(series, *params)
+            # Результаты разделяются между стратегиями, запрещаем их изменение.
+            if isinstance(result, tuple):
+                for r in result:
+                    r.setflags(write=False)
+            else:
+                result.setflags(write=False)
+
+            # Кэш ограничен и по числу записей, и по занимаемой памяти:
+            # матрицы из многих рядов слишком велики, чтобы держать их долго.
+            size = _nbytes(result)
+            if size > CACHE_MAX_BYTES:
+                return result
+            with _cache_lock:
+                if cache_key not in _cache:
+                    _cache[cache_key] = result
+                    _cache_bytes += size
+                while len(_cache) > CACHE_MAX_SIZE or _cache_bytes > CACHE_MAX_BYTES:
+                    _, evicted = _cache.popitem(last=False)
+                    _cache_bytes -= _nbytes(evicted)
+            return result
+        return wrapper
+    return decorator
+
+
+# Все индикаторы считаются вдоль первой оси, поэтому принимают как один ряд,
+# так и матрицу (время x инструменты) с рядами нескольких инструментов в столбцах.
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    # Значение с индексом t — сумма values[t - window + 1:t + 1], до этого — nan.
+    # Суммируем окна напрямую, а не через разность кумулятивных сумм,
+    # чтобы на горизонтальных участках получать точный ноль.
+    result = np.full(values.shape, np.nan)
+    if 0 < window <= len(values):
+        size = len(values) - window + 1
+        total = values[window - 1:].copy()
+        for k in range(window - 2, -1, -1):
+            total += values[k:k + size]
+        result[window - 1:] = total
+    return result
+
+
+@cached('sma')
+def sma(prices: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_sum(prices, window) / window
+
+
+@cached('ema')
+def ema(prices: np.ndarray, span: int) -> np.ndarray:
+    result = np.full(prices.shape, np.nan)
+    if len(prices) == 0:
+        return result
+    alpha = 2 / (span + 1)
+    if prices.ndim == 1:
+        values = prices.tolist()
+        last = values[0]
+        smoothed = []
+        for price in values:
+            last = alpha * price + (1 - alpha) * last
+            smoothed.append(last)
+        result[:] = smoothed
+    else:
+        last = prices[0]
+        for t in range(len(prices)):
+            last = alpha * prices[t] + (1 - alpha) * last
+            result[t] = last
+    return result
+
+
+@cached('volatility')
+def rolling_volatility(prices: np.ndarray, n: int) -> np.ndarray:
+    # Волатильность по Кауфману: сумма модулей изменений цены за n последних периодов.
+    # Значение с индексом t — sum(|prices[t - i] - prices[t - i - 1]| for i in range(n)).
+    result = np.full(prices.shape, np.nan)
+    if len(prices) > 1:
+        result[1:] = _rolling_sum(np.abs(np.diff(prices, axis=0)), n)
+    return result
+
+
+@cached('er')
+def efficiency_ratio(prices: np.ndarray, n: int) -> np.ndarray:
+    # Направление считается относительно цены n + 1 периодов назад, как в исходном AMA.
+    # Раньше индекса n + 1 такой цены нет, и коэффициент не определён.
+    direction = np.full(prices.shape, np.nan)
+    if len(prices) > n + 1:
+        direction[n + 1:] = np.abs(prices[n + 1:] - prices[:-n - 1])
+    volatility = rolling_volatility(prices, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        er = direction / volatility
+    # На полностью горизонтальном участке тренда нет.
+    er[volatility == 0] = 0.
+    return er
+
+
+@cached('ama')
+def ama(prices: np.ndarray, fast: int, slow: int, n: int, start: int, initial: Optional[float] = None) -> np.ndarray:
+    # Адаптивная скользящая средняя Кауфмана, рассчитанная начиная с индекса start.
+    # initial — значение средней на индексе start - 1, если расчёт продолжается
+    # с сохранённого состояния; иначе оно берётся как среднее предшествующих цен.
+    result = np.full(prices.shape, np.nan)
+    if start >= len(prices):
+        return result
+
+    fastest = 2 / (fast + 1)
+    slowest = 2 / (slow + 1)
+    er = efficiency_ratio(prices, n)
+    smooth = er * (fastest - slowest) + slowest
+    # Если тренд слабый, то возводим коэффициент сглаживания в квадрат.
+    weak = er < .3
+    smooth[weak] = smooth[weak] ** 2
+
+    offset = fast + slow // 2
+    if prices.ndim == 1:
+        # Для одного ряда рекурсия на числах Python быстрее, чем на скалярах numpy.
+        values = prices.tolist()
+        last_ma = initial if initial is not None else sum(values[start - offset:start]) / (offset - 1)
+        smoothed = []
+        for t, s in enumerate(smooth[start:].tolist(), start):
+            last_ma = s * values[t] + (1 - s) * last_ma
+            smoothed.append(last_ma)
+        result[start:] = smoothed
+    else:
+        last_ma = initial if initial is not None else prices[start - offset:start].sum(axis=0) / (offset - 1)
+        for t in range(start, len(prices)):
+            last_ma = smooth[t] * prices[t] + (1 - smooth[t]) * last_ma
+            result[t] = last_ma
+    return result
+
+
+def cross_above(series: np.ndarray, line: np.ndarray) -> np.ndarray:
+    # series[t] > line[t] >= series[t - 1]: линия протыкает график сверху.
+    result = np.zeros(series.shape, dtype=bool)
+    result[1:] = (series[1:] > line[1:]) & (line[1:] >= series[:-1])
+    return result
+
+
+def cross_below(series: np.ndarray, line: np.ndarray) -> np.ndarray:
+    # series[t] < line[t] <= series[t - 1]: линия протыкает график снизу.
+    result = np.zeros(series.shape, dtype=bool)
+    result[1:] = (series[1:] < line[1:]) & (line[1:] <= series[:-1])
+    return result
+
+
+def crossovers(series: np.ndarray, line: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return cross_above(series, line), cross_below(series, line)
@@ -1,7 +1,16 @@
+import importlib
+import pkgutil
+import threading
 from abc import ABC
-from typing import Tuple
+from collections.abc import Mapping
+from typing import Optional, Tuple
 from enum import Enum
 
+import numpy as np
+
+
+__all__ = ['PositionStatus', 'StrategyAbstract', 'StrategyRegistry']
+
 
 class PositionStatus(Enum):
     none = 0
@@ -10,5 +19,72 @@ class PositionStatus(Enum):
 
 
 class StrategyAbstract(ABC):
+    # Код стратегии, по которому она доступна в реестре.
+    code: str = None
+
     def calculate(self, prices, params) -> Tuple[float, float]:
         raise NotImplementedError
+
+    def resume(self, prices, params, state: Optional[dict] = None) \
+            -> Tuple[Optional[float], Optional[float], Optional[dict]]:
+        # Расчёт с сохранением состояния. Без state считает весь ряд prices,
+        # с state — продолжает с сохранённого состояния, и prices содержит только новые свечи.
+        # Возвращает доходности стратегии и удержания и состояние после последней свечи.
+        raise NotImplementedError
+
+    def calculate_portfolio(
+            self, prices, params, use_cache: bool = True
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        # prices — матрица (время x инструменты), выровненная по общему календарю.
+        # Возвращает доходности стратегии и удержания по каждому инструменту.
+        # use_cache=False — для одноразовых матриц, индикаторы по ним не кэшируются.
+        raise NotImplementedError
+
+
+class StrategyRegistry(Mapping):
+    # Реестр стратегий пакета. Каждый публичный модуль пакета считается плагином,
+    # код стратегии совпадает с именем модуля в верхнем регистре (ama -> AMA).
+    # Модуль импортируется только при первом обращении к его стратегии.
+    def __init__(self, package: str, path):
+        self._package = package
+        self._path = path
+        self._instances = dict()
+        self._module_names = None
+        self._lock = threading.Lock()
+
+    def _modules(self) -> dict:
+        # Каталог пакета просматривается один раз: коды неизвестных стратегий
+        # проверяются на каждом запросе.
+        if self._module_names is None:
+            self._module_names = {
+                module.name.upper(): module.name
+                for module in pkgutil.iter_modules(self._path)
+                if not module.name.startswith('_')
+            }
+        return self._module_names
+
+    def _load(self, code: str) -> StrategyAbstract:
+        module_name = self._modules().get(code)
+        if module_name is None:
+            raise KeyError(code)
+        module = importlib.import_module(f'.{module_name}', self._package)
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, StrategyAbstract) and value.code == code:
+                return value()
+        raise KeyError(code)
+
+    def __getitem__(self, code: str) -> StrategyAbstract:
+        if code not in self._instances:
+            with self._lock:
+                if code not in self._instances:
+                    self._instances[code] = self._load(code)
+        return self._instances[code]
+
+    def __contains__(self, code) -> bool:
+        return code in self._instances or code in self._modules()
+
+    def __iter__(self):
+        return iter(sorted(self._modules()))
+
+    def __len__(self) -> int:
+        return len(self._modules())
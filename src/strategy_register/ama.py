@@ -1,72 +1,63 @@
 from typing import Tuple, Optional
 
+import numpy as np
+
 from ._strategy_register import StrategyAbstract, PositionStatus
-from matplotlib import pyplot as plt
+from . import _indicators as indicators
 
 
 SHOW_PLOT = False
 
+# Состояние торгового цикла до первой свечи.
+INITIAL_STATE = {
+    'result': 1.,
+    'position': PositionStatus.none.name,
+    'first_buy': True,
+    'entry_price': None,
+    'moving_average': None,
+}
+
 
 class StrategyAMA(StrategyAbstract):
-    constants = dict()
+    code = 'AMA'
 
-    @staticmethod
-    def validate_params(params: dict):
+    param_names = ('fast', 'n', 'slow')
+
+    @classmethod
+    def validate_params(cls, params: dict):
         for p, val in params.items():
+            if p not in cls.param_names:
+                raise ValueError(f'Unknown parameter `{p}`.')
             if not (isinstance(val, int) and val > 0):
                 raise ValueError(f'Parameter `{p}` must be integer and greather than 0.')
 
         if not params['fast'] < params['n'] < params['slow']:
             raise ValueError('`fast` must be < than `n`, and `n` must be < `slow`.')
 
-    def calculate_ama(self, prices, fast, slow, n, t, last_ma):
-        if last_ma is None:
-            offset = fast + slow // 2
-            last_ma = sum(prices[t - offset:t]) / (offset - 1)
-
-        fastest = self.constants['fastest']
-        slowest = self.constants['slowest']
-
-        direction = abs(prices[t] - prices[t - n - 1])
-        volatility = sum([abs(prices[t - i] - prices[t - i - 1]) for i in range(n)])
-        er = direction / volatility
-        smooth = er * (fastest - slowest) + slowest
-
-        if er < .3:
-            # Если тренд слабый, то возводим коэффициент сглаживания в квадрат.
-            smooth = smooth ** 2
-
-        return smooth * prices[t] + (1 - smooth) * last_ma
-
-    def calculate(self, prices: list, params: dict, show_plot=False) -> Tuple[Optional[float], Optional[float]]:
-        mas = []
-        self.validate_params(params)
-        # Задаём константы для алгоритма расчёта AMA в специальном словаре класса.
-        self.constants['fastest'] = 2 / (params['fast'] + 1)
-        self.constants['slowest'] = 2 / (params['slow'] + 1)
-        margin = max(params.values())
-
-        # Производим валидацию длины рассматриваемого периода.
-        if len(prices) < margin or len(prices) < 2:
-            # Если период слишком мал, то возвращаем null.
-            return None, None
+    @staticmethod
+    def start_index(params: dict) -> int:
+        # Первая свеча торгового цикла: до неё должно быть max(params) - 1 свечей истории
+        # и цена n + 1 периодов назад, от которой считается направление тренда.
+        return max(max(params.values()) - 1, params['n'] + 1)
 
-        result = 1.
+    @staticmethod
+    def _trade(prices: list, mas: list, crosses_above: list, crosses_below: list, start: int, state: dict,
+               show_plot=False) -> dict:
+        # Торговый цикл по свечам с индекса start. Состояние цикла передаётся и возвращается
+        # словарём, чтобы расчёт можно было сохранить и продолжить на новых свечах.
+        result = state['result']
         # Держим значение Enum, который будет служить флагом, куплен ли инструмент.
-        position_status = PositionStatus.none
+        position_status = PositionStatus[state['position']]
 
         # Флаг для первой покупки.
-        first_buy = True
-        last_price = None
-        last_moving_average = None
-        for t in range(margin - 1, len(prices)):
-            # Считаем AMA.
-            moving_average = self.calculate_ama(
-                prices, params['fast'], params['slow'], params['n'], t, last_moving_average
-            )
+        first_buy = state['first_buy']
+        last_price = state['entry_price']
+        last_moving_average = state['moving_average']
+        for t in range(start, len(prices)):
+            moving_average = mas[t]
 
             # Условия покупки.
-            if prices[t] > moving_average >= prices[t - 1] or \
+            if crosses_above[t] or \
                     first_buy and last_moving_average and moving_average > last_moving_average:
                 # MA протыкает график сверху. Покупаем.
                 if first_buy and last_moving_average:
@@ -86,7 +77,7 @@ class StrategyAMA(StrategyAbstract):
                 position_status = PositionStatus.long
 
             # Условия продажи.
-            if prices[t] < moving_average <= prices[t - 1]:
+            if crosses_below[t]:
                 # MA протыкает график снизу. Продаём.
                 if position_status == PositionStatus.long:
                     # Засчитаем продажу, если мы покупали.
@@ -98,13 +89,134 @@ class StrategyAMA(StrategyAbstract):
 
             # Запоминаем значение MA для следующей итерации.
             last_moving_average = moving_average
-            mas.append(moving_average)
             if show_plot:
                 print(prices[t])
                 print(moving_average)
 
+        return {
+            'result': result,
+            'position': position_status.name,
+            'first_buy': first_buy,
+            'entry_price': last_price,
+            'moving_average': last_moving_average,
+        }
+
+    def calculate(self, prices: list, params: dict, show_plot=False) -> Tuple[Optional[float], Optional[float]]:
+        self.validate_params(params)
+        margin = max(params.values())
+
+        # Производим валидацию длины рассматриваемого периода.
+        if len(prices) < margin or len(prices) < 2:
+            # Если период слишком мал, то возвращаем null.
+            return None, None
+
+        # Индикаторы кэшируются по содержимому ряда и разделяются между стратегиями.
+        series = indicators.as_series(prices)
+        key = indicators.series_key(series)
+        start = self.start_index(params)
+        moving_averages = indicators.ama(
+            series, params['fast'], params['slow'], params['n'], start, key=key
+        )
+        crosses_above, crosses_below = indicators.crossovers(series, moving_averages)
+        mas = moving_averages.tolist()
+
+        state = self._trade(
+            prices, mas, crosses_above.tolist(), crosses_below.tolist(), start, INITIAL_STATE, show_plot
+        )
+
         if show_plot:
-            x = range(len(prices[margin - 1:]))
-            plt.plot(x, prices[margin - 1:], x, mas)
+            # matplotlib нужен только для отладочного графика, поэтому импортируется здесь.
+            from matplotlib import pyplot as plt
+            x = range(len(prices[start:]))
+            plt.plot(x, prices[start:], x, mas[start:])
             plt.show()
-        return result, prices[-1] / prices[0]
+        return state['result'], prices[-1] / prices[0]
+
+    def resume(self, prices: list, params: dict, state: Optional[dict] = None) \
+            -> Tuple[Optional[float], Optional[float], Optional[dict]]:
+        self.validate_params(params)
+
+        if state is None:
+            margin = max(params.values())
+            if len(prices) < margin or len(prices) < 2:
+                return None, None, None
+            series = indicators.as_series(prices)
+            start, first_price = self.start_index(params), float(series[0])
+            moving_averages = indicators.ama(
+                series, params['fast'], params['slow'], params['n'], start, key=indicators.series_key(series)
+            )
+            line = moving_averages
+        else:
+            # Для продолжения хватает последних n + 1 цен: по ним считаются направление
+            # и волатильность для коэффициента сглаживания на новых свечах.
+            series = indicators.as_series(state['window'] + list(prices))
+            start, first_price = len(state['window']), state['first_price']
+            moving_averages = indicators.ama(
+                series, params['fast'], params['slow'], params['n'], start, state['moving_average'],
+                key=indicators.series_key(series)
+            )
+            # Для пересечения на первой новой свече нужно сохранённое значение MA.
+            line = moving_averages.copy()
+            line[start - 1] = state['moving_average']
+
+        crosses_above, crosses_below = indicators.crossovers(series, line)
+        values = series.tolist()
+        new_state = self._trade(
+            values, moving_averages.tolist(), crosses_above.tolist(), crosses_below.tolist(), start,
+            state or INITIAL_STATE
+        )
+        new_state['window'] = values[-(params['n'] + 1):]
+        new_state['first_price'] = first_price
+        return new_state['result'], values[-1] / first_price, new_state
+
+    def calculate_portfolio(
+            self, prices, params: dict, use_cache: bool = True
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        # Та же логика, что и в calculate, но шаг по времени выполняется
+        # сразу для всех инструментов (столбцов матрицы) векторными операциями.
+        self.validate_params(params)
+        margin = max(params.values())
+
+        series = indicators.as_series(prices)
+        if len(series) < margin or len(series) < 2:
+            return None, None
+
+        start = self.start_index(params)
+        if use_cache:
+            mas = indicators.ama(
+                series, params['fast'], params['slow'], params['n'], start, key=indicators.series_key(series)
+            )
+        else:
+            with indicators.no_cache():
+                mas = indicators.ama(series, params['fast'], params['slow'], params['n'], start)
+        crosses_above, crosses_below = indicators.crossovers(series, mas)
+
+        instruments_count = series.shape[1]
+        result = np.ones(instruments_count)
+        long = np.zeros(instruments_count, dtype=bool)
+        first_buy = np.ones(instruments_count, dtype=bool)
+        last_price = np.full(instruments_count, np.nan)
+
+        for t in range(start, len(series)):
+            moving_average = mas[t]
+
+            # Условия покупки. На первом шаге предыдущего значения MA ещё нет.
+            has_last = t > start
+            rising = first_buy & (moving_average > mas[t - 1]) if has_last else np.zeros_like(first_buy)
+            buy = crosses_above[t] | rising
+            # Если инструмент ещё не покупался и МА возрастает.
+            first = buy & first_buy & has_last
+            last_price = np.where(first, (series[t - 1] + series[t]) / 2, last_price)
+            first_buy &= ~first
+            long |= first
+            # Запоминаем цену покупки, которая пригодится при расчёте во время продажи.
+            last_price = np.where(buy & ~long, moving_average, last_price)
+            long |= buy
+
+            # Условия продажи.
+            sell = crosses_below[t]
+            closed = sell & long
+            result[closed] += moving_average[closed] / last_price[closed] - 1.
+            long &= ~sell
+
+        return result, series[-1] / series[0]
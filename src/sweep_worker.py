@@ -0,0 +1,99 @@
+"""Воркер распределённого перебора параметров.
+
+Забирает шарды из таблицы sweep_shard и считает их. Воркеров можно запускать
+сколько угодно на любых машинах с доступом к БД:
+
+    DB_URI=postgresql://... python -m src.sweep_worker
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from . import core
+from .db import db
+
+
+def load_prices(job) -> list:
+    prices = db.get_prices(
+        datetime_from=job.datetime_from,
+        datetime_to=job.datetime_to,
+        financial_instrument_id=job.financial_instrument_id,
+        interval=job.interval,
+        use_primary=True
+    )
+    return [price.price_open for price in prices]
+
+
+@contextmanager
+def heartbeat(shard_id, worker: str, interval: float):
+    # Пока шард считается, в отдельном потоке обновляем claimed_at, иначе долгий шард
+    # через stale-after выдали бы другому воркеру.
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            try:
+                with db.session_scope():
+                    if not db.touch_sweep_shard(shard_id, worker, datetime.now()):
+                        # Шард уже выдан другому воркеру.
+                        return
+            except Exception as e:
+                logging.exception(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distributed parameter sweep worker.')
+    parser.add_argument('--name', default=f'{socket.gethostname()}:{os.getpid()}')
+    parser.add_argument('--poll', type=float, default=1., help='Seconds to wait when there is no work.')
+    parser.add_argument(
+        '--stale-after', type=float, default=600.,
+        help='Seconds without a heartbeat after which a claimed shard is reclaimed.'
+    )
+    parser.add_argument('--once', action='store_true', help='Exit when there are no pending shards.')
+    args = parser.parse_args()
+
+    # Шарды одной задачи считаются на одном и том же ряде, поэтому держим его в памяти.
+    job_id, prices = None, None
+    while True:
+        # Каждый шард считается в своей сессии: после ошибки она откатывается и закрывается.
+        with db.session_scope():
+            now = datetime.now()
+            shard = db.claim_sweep_shard(
+                args.name, now, now - timedelta(seconds=args.stale_after), core.SWEEP_MAX_ATTEMPTS
+            )
+            if shard is not None:
+                try:
+                    if shard.sweep_job_id != job_id:
+                        job_id, prices = shard.sweep_job_id, load_prices(shard.sweep_job)
+                    with heartbeat(shard.id, args.name, args.stale_after / 3):
+                        core.run_sweep_shard(shard, prices, args.name)
+                except Exception as e:
+                    # Шард возвращается в очередь, а после SWEEP_MAX_ATTEMPTS попыток помечается неудачным.
+                    logging.exception(e)
+                    try:
+                        db.session.rollback()
+                        core.release_sweep_shard(shard, args.name)
+                    except Exception as e:
+                        # Если вернуть шард не удалось, его выдадут повторно после stale-after.
+                        logging.exception(e)
+        if shard is None:
+            if args.once:
+                break
+            time.sleep(args.poll)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+# Длительности этапов обработки текущего запроса в миллисекундах.
+_timings = contextvars.ContextVar('timings', default=None)
+
+
+def start_request() -> dict:
+    timings = dict()
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def stage(name: str):
+    timings = _timings.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.) + (time.perf_counter() - started) * 1000
+
+
+def server_timing_header(timings: dict) -> str:
+    return ', '.join(f'{name};dur={duration:.3f}' for name, duration in timings.items())
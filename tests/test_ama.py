@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.strategy_register import _indicators, strategies
+
+
+def random_prices(rng, size: int) -> list:
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, .02, size)))
+    # Горизонтальный участок, на котором волатильность равна нулю.
+    prices[size // 3:size // 3 + 15] = prices[size // 3]
+    return prices.round(2).tolist()
+
+
+def random_params(rng) -> dict:
+    n = int(rng.integers(3, 12))
+    # slow == n + 1 — граничный случай, когда цикл начинается сразу после окна направления.
+    return {'fast': int(rng.integers(1, n)), 'n': n, 'slow': n + int(rng.integers(1, 20))}
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_resume_equals_full_recalculation(seed):
+    rng = np.random.default_rng(seed)
+    strategy = strategies['AMA']
+    prices = random_prices(rng, 300)
+    params = random_params(rng)
+    expected = strategy.calculate(prices, params)
+
+    # Расчёт по частям со случайными границами и сохранением состояния в JSON, как в БД.
+    first = strategy.start_index(params) + 1
+    splits = sorted(set(rng.integers(first, len(prices) + 1, 3).tolist()))
+    profit, hold, state = strategy.resume(prices[:splits[0]], params)
+    for start, end in zip(splits, splits[1:] + [len(prices)]):
+        profit, hold, state = strategy.resume(prices[start:end], params, json.loads(json.dumps(state)))
+
+    assert (profit, hold) == expected
+
+
+@pytest.mark.parametrize('params', [{'fast': 3, 'n': 5, 'slow': 6}, {'fast': 2, 'n': 10, 'slow': 30}])
+def test_resume_without_new_prices_keeps_result(params):
+    strategy = strategies['AMA']
+    prices = random_prices(np.random.default_rng(0), 200)
+    profit, hold, state = strategy.resume(prices, params)
+    assert strategy.resume([], params, state)[:2] == (profit, hold)
+
+
+def test_portfolio_matches_single_instrument_calculation():
+    rng = np.random.default_rng(1)
+    strategy = strategies['AMA']
+    series = [random_prices(rng, 250) for _ in range(3)]
+    params = {'fast': 3, 'n': 5, 'slow': 6}
+    profits, holds = strategy.calculate_portfolio(np.column_stack(series), params)
+    for prices, profit, hold in zip(series, profits, holds):
+        assert (profit, hold) == pytest.approx(strategy.calculate(prices, params))
+
+
+def test_portfolio_without_cache_leaves_cache_untouched():
+    rng = np.random.default_rng(2)
+    strategy = strategies['AMA']
+    prices = np.column_stack([random_prices(rng, 250) for _ in range(3)])
+    params = {'fast': 3, 'n': 5, 'slow': 9}
+    _indicators.clear_cache()
+    uncached = strategy.calculate_portfolio(prices, params, use_cache=False)
+    assert len(_indicators._cache) == 0
+    cached = strategy.calculate_portfolio(prices, params)
+    assert len(_indicators._cache) > 0
+    np.testing.assert_array_equal(uncached[0], cached[0])
+    np.testing.assert_array_equal(uncached[1], cached[1])
+
+
+def test_unknown_params_are_rejected():
+    with pytest.raises(ValueError):
+        strategies['AMA'].validate_params({'fast': 2, 'n': 5, 'slow': 9, 'note': 1})
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.db import models
+from src.db.buffer import WriteBehindBuffer
+
+
+def report(strategy='AMA'):
+    return dict(
+        datetime=datetime(2020, 1, 1),
+        datetime_from=datetime(2019, 1, 1),
+        datetime_to=datetime(2020, 1, 1),
+        strategy=strategy,
+        interval='day',
+        hold_profit=1.,
+        strategy_profit=1.,
+        financial_instrument_id=1
+    )
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    models.BaseModel.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def count_reports(session_factory) -> int:
+    return session_factory().query(models.TestReport).count()
+
+
+def test_flush_writes_rows(session_factory):
+    buffer = WriteBehindBuffer(models.TestReport, session_factory)
+    for _ in range(3):
+        buffer.add(report())
+    buffer.flush()
+    assert count_reports(session_factory) == 3
+
+
+def test_bad_row_is_dropped_and_the_rest_written(session_factory):
+    buffer = WriteBehindBuffer(models.TestReport, session_factory)
+    for i in range(7):
+        buffer.add(report(strategy=None if i == 4 else 'AMA'))
+    buffer.flush()
+    assert count_reports(session_factory) == 6
+    # Плохая строка не остаётся в буфере и не блокирует следующие записи.
+    buffer.add(report())
+    buffer.flush()
+    assert count_reports(session_factory) == 7
+
+
+def test_rows_are_kept_while_database_is_unavailable(session_factory):
+    engine = create_engine('sqlite:////nonexistent/directory/db.sqlite')
+    buffer = WriteBehindBuffer(models.TestReport, sessionmaker(bind=engine), max_retries=2)
+    buffer.add(report())
+    for _ in range(4):
+        with pytest.raises(exc.OperationalError):
+            buffer.flush()
+
+    buffer.session_factory = session_factory
+    buffer.flush()
+    assert count_reports(session_factory) == 1
+
+
+def test_buffer_drops_oldest_rows_over_capacity(session_factory):
+    buffer = WriteBehindBuffer(models.TestReport, session_factory, max_rows=3)
+    for profit in range(5):
+        buffer.add(dict(report(), strategy_profit=float(profit)))
+    buffer.flush()
+    profits = [r.strategy_profit for r in session_factory().query(models.TestReport)]
+    assert sorted(profits) == [2., 3., 4.]
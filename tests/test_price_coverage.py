@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from src import core
+
+
+INSTRUMENT = core.Instrument(id=1, ticker='TEST', figi='FIGI', name='Test')
+
+
+def coverage(datetime_from, datetime_to):
+    return mock.Mock(datetime_from=datetime_from, datetime_to=datetime_to)
+
+
+def stored(rows, datetime_from, datetime_to) -> bool:
+    with mock.patch.object(core.db, 'get_price_coverage', return_value=rows):
+        return core.prices_stored(INSTRUMENT, 'day', datetime_from, datetime_to)
+
+
+def test_historical_period_requires_full_coverage():
+    rows = [coverage(datetime(2020, 1, 1), datetime(2020, 1, 10))]
+    assert stored(rows, datetime(2020, 1, 1), datetime(2020, 1, 10))
+    assert not stored(rows, datetime(2020, 1, 1), datetime(2020, 1, 10, 23))
+    assert not stored(rows, datetime(2020, 1, 1), datetime(2020, 1, 11))
+
+
+def test_gap_in_coverage_is_not_stored():
+    rows = [
+        coverage(datetime(2020, 1, 1), datetime(2020, 1, 5)),
+        coverage(datetime(2020, 1, 6), datetime(2020, 1, 10)),
+    ]
+    assert not stored(rows, datetime(2020, 1, 1), datetime(2020, 1, 10))
+
+
+def test_recent_period_allows_freshness_lag():
+    now = datetime.utcnow()
+    rows = [coverage(now - timedelta(days=30), now - core.PRICE_FRESHNESS / 2)]
+    assert stored(rows, now - timedelta(days=30), now)
+    assert stored(rows, now - timedelta(days=30), now + timedelta(days=3))
+
+
+def test_past_period_near_now_requires_full_coverage():
+    now = datetime.utcnow()
+    rows = [coverage(now - timedelta(days=30), now - core.PRICE_FRESHNESS * 3)]
+    assert not stored(rows, now - timedelta(days=30), now - core.PRICE_FRESHNESS * 2)
@@ -0,0 +1,110 @@
+import threading
+import time
+from datetime import datetime
+from unittest import mock
+
+
+from src import core
+from src.single_flight import SingleFlight
+
+
+THREADS = 8
+
+
+def run_concurrently(target, count=THREADS) -> list:
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_followers(release: threading.Event, threads: list):
+    # Даём остальным потокам дойти до ожидания результата первого и отпускаем его.
+    time.sleep(.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait()
+        return 42
+
+    threads, results = run_concurrently(lambda: flight.do('key', load))
+    wait_for_followers(release, threads)
+    assert len(calls) == 1
+    assert results == [42] * THREADS
+
+
+def test_concurrent_calls_share_the_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait()
+        raise ValueError('broker is down')
+
+    threads, results = run_concurrently(lambda: flight.do('key', load))
+    wait_for_followers(release, threads)
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    # После ошибки ключ освобождается и следующий вызов выполняется заново.
+    assert flight.do('key', lambda: 1) == 1
+
+
+def test_fetch_prices_loads_once_for_concurrent_requests():
+    release = threading.Event()
+    candle = {'time': datetime(2020, 1, 3, 7), 'o': 1., 'c': 2., 'h': 3., 'l': .5}
+    instrument = core.Instrument(id=1, ticker='SBER', figi='BBG004730N88', name='Sberbank')
+    row = mock.Mock(datetime=candle['time'], price_open=1.)
+
+    broker_client = mock.Mock()
+
+    def get_prices(**kwargs):
+        release.wait()
+        return [candle]
+
+    broker_client.get_prices.side_effect = get_prices
+
+    with mock.patch.object(core, 'get_or_create_client', return_value=broker_client), \
+            mock.patch.object(core.db, 'get_report', return_value=None), \
+            mock.patch.object(core.db, 'get_price_coverage', return_value=[]), \
+            mock.patch.object(core.db, 'write_prices') as write_prices, \
+            mock.patch.object(core.db, 'get_prices', return_value=[row]):
+        threads, results = run_concurrently(lambda: core.fetch_prices(
+            datetime(2020, 1, 1), datetime(2020, 2, 1), 'token', instrument, 'day', 'AMA'
+        ))
+        wait_for_followers(release, threads)
+
+    assert broker_client.get_prices.call_count == 1
+    assert write_prices.call_count == 1
+    assert all(result == (row,) for result in results)
+    # Все потоки получают один и тот же неизменяемый результат.
+    assert all(result is results[0] for result in results)
+    assert isinstance(results[0], tuple)
+
+
+def test_fetch_instrument_returns_plain_values():
+    ticker = 'SBER'
+    orm_instrument = core.db.models.FinancialInstrument(id=1, ticker=ticker, figi='BBG004730N88', name='Sberbank')
+    with mock.patch.object(core, 'get_or_create_client'), \
+            mock.patch.object(core.db, 'get_instrument', return_value=orm_instrument), \
+            mock.patch.object(core.db, 'get_or_create_instrument', return_value=(orm_instrument, False)):
+        instrument = core.fetch_instrument(ticker, 'token')
+    assert instrument == core.Instrument(id=1, ticker=ticker, figi='BBG004730N88', name='Sberbank')
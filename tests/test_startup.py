@@ -0,0 +1,8 @@
+from loadtest.startup import measure_import
+
+
+def test_app_import_is_lazy():
+    # Импорт приложения без DB_URI не загружает тяжёлые модули и не создаёт движки БД.
+    probe = measure_import()
+    assert probe['loaded'] == []
+    assert probe['engines'] == []